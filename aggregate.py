@@ -0,0 +1,207 @@
+import math
+import re
+
+try:
+    import numpy as np
+except ImportError:  # aggregation endpoints report it as unavailable
+    np = None
+
+METRICS = ('cpu', 'memory', 'net_rx', 'net_tx', 'disk')
+AGGS = ('min', 'avg', 'max', 'p50', 'p95', 'p99', 'ma')
+PERCENTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def available():
+    """True when NumPy is installed."""
+    return np is not None
+
+
+def parse_bucket(text):
+    """Parse a bucket width such as '30s', '5m', '1h' or '1d' into seconds; None if invalid."""
+    m = re.fullmatch(r'(\d+)([smhd])', (text or '').strip())
+    if not m or int(m.group(1)) <= 0:
+        return None
+    return int(m.group(1)) * _UNITS[m.group(2)]
+
+
+def metric_arrays(cols):
+    """Turn HistoryStore.columns(..., with_disk=True) into float arrays per metric.
+
+    Returns (t, {metric: values}); net rates are MB/s from consecutive
+    samples (NaN for the first sample and across counter resets) and disk
+    is the used percent over all mounts. When cols has a previous sample,
+    it is only used for the first rate and then dropped.
+    """
+    t = np.frombuffer(cols['t'], dtype=np.float64)
+    if not len(t):
+        return t, {k: t for k in METRICS}
+    dt = np.diff(t)
+    dt[dt <= 0] = np.nan
+
+    def rate(column):
+        v = np.frombuffer(column, dtype=np.uint64).astype(np.float64)
+        d = np.diff(v)
+        d[d < 0] = np.nan
+        return np.concatenate(([np.nan], d / dt / (1024*1024)))
+
+    used = np.zeros(len(t))
+    size = np.zeros(len(t))
+    for total, u, f in cols['disk'].values():
+        u = np.frombuffer(u, dtype=np.uint64).astype(np.float64)
+        f = np.frombuffer(f, dtype=np.uint64).astype(np.float64)
+        present = np.frombuffer(total, dtype=np.uint64) > 0
+        used += np.where(present, u, 0)
+        size += np.where(present, u + f, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        disk = np.where(size > 0, used / size * 100, np.nan)
+
+    values = {
+        'cpu': np.frombuffer(cols['cpu_avg'], dtype=np.float64),
+        'memory': np.frombuffer(cols['mem_percent'], dtype=np.float32).astype(np.float64),
+        'net_rx': rate(cols['bytes_recv']),
+        'net_tx': rate(cols['bytes_sent']),
+        'disk': disk,
+    }
+    if cols['previous']:
+        t = t[1:]
+        values = {k: v[1:] for k, v in values.items()}
+    return t, values
+
+
+def _groups(ids):
+    """Start offsets of the runs of equal ids (ids sorted)."""
+    return np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+
+
+def _percentile(v, ids, starts, q):
+    """Linear-interpolated q-quantile of each run of ids, values sorted within runs."""
+    order = np.lexsort((v, ids))
+    v = v[order]
+    counts = np.diff(np.append(starts, len(v)))
+    pos = starts + q * (counts - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    return v[lo] + (v[hi] - v[lo]) * (pos - lo)
+
+
+def bucketize(t, values, seconds, agg, window=5):
+    """Aggregate each metric into buckets of `seconds`.
+
+    agg is one of AGGS; 'ma' is the trailing moving average of the bucket
+    averages over `window` buckets. NaN samples are ignored and empty
+    buckets come back as NaN. Returns (bucket start times, {metric: array}).
+    """
+    if not len(t):
+        return t, {k: t for k in values}
+    buckets = np.floor(t / seconds) * seconds
+    starts = _groups(buckets)
+    bucket_t = buckets[starts]
+    bucket_id = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(t))))
+
+    out = {}
+    for metric, v in values.items():
+        keep = ~np.isnan(v)
+        v, ids = v[keep], bucket_id[keep]
+        res = np.full(len(bucket_t), np.nan)
+        if len(v):
+            g = _groups(ids)
+            nonempty = ids[g]
+            if agg == 'min':
+                res[nonempty] = np.minimum.reduceat(v, g)
+            elif agg == 'max':
+                res[nonempty] = np.maximum.reduceat(v, g)
+            elif agg in PERCENTILES:
+                res[nonempty] = _percentile(v, ids, g, PERCENTILES[agg])
+            else:
+                res[nonempty] = np.add.reduceat(v, g) / np.diff(np.append(g, len(v)))
+                if agg == 'ma':
+                    res = moving_average(res, window)
+        out[metric] = res
+    return bucket_t, out
+
+
+def moving_average(v, window):
+    """Trailing mean over `window` points, skipping NaN (NaN when the window is all NaN)."""
+    present = ~np.isnan(v)
+    sums = np.cumsum(np.where(present, v, 0.0))
+    counts = np.cumsum(present)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def summarize(values):
+    """min / avg / max / p50 / p95 / p99 / last of each metric over the whole range."""
+    out = {}
+    for metric, v in values.items():
+        present = v[~np.isnan(v)]
+        if not len(present):
+            out[metric] = None
+            continue
+        p50, p95, p99 = np.percentile(present, [50, 95, 99])
+        out[metric] = {
+            'min': float(present.min()),
+            'avg': float(present.mean()),
+            'max': float(present.max()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'last': float(present[-1]),
+            'samples': int(len(present)),
+        }
+    return out
+
+
+def heatmap(t, values, cores, seconds, agg='avg'):
+    """Per-core utilization per time bucket from a HistoryStore.percpu() result.
+
+    t and values are the array columns (values: one byte per core, sample-major).
+    Returns (bucket start times, uint8 matrix of buckets x cores) with the avg
+    (rounded) or max of each core over each bucket's samples; buckets without
+    samples are left out.
+    """
+    t = np.frombuffer(t, dtype=np.float64)
+    if not len(t) or not cores:
+        return t, np.zeros((0, cores), dtype=np.uint8)
+    m = np.frombuffer(values, dtype=np.uint8).reshape(len(t), cores)
+    buckets = np.floor(t / seconds) * seconds
+    starts = _groups(buckets)
+    if agg == 'max':
+        out = np.maximum.reduceat(m, starts, axis=0)
+    else:
+        counts = np.diff(np.append(starts, len(t)))[:, None]
+        sums = np.add.reduceat(m.astype(np.uint32), starts, axis=0)
+        out = np.rint(sums / counts).astype(np.uint8)
+    return buckets[starts], out
+
+
+def raw_series(cols):
+    """cpu, memory and net_rx / net_tx (MB/s) lists for MetricStore._raw_series.
+
+    Same values as the per-sample loop it replaces: rates between consecutive
+    samples (dt of 1s when the clock did not advance), 0 for the first sample
+    unless cols carries the previous one, which is then dropped.
+    """
+    t = np.frombuffer(cols['t'], dtype=np.float64)
+    first = 1 if cols['previous'] else 0
+    dt = np.diff(t)
+    dt[dt <= 0] = 1
+
+    def rate(column):
+        v = np.frombuffer(column, dtype=np.uint64).astype(np.float64)
+        r = np.round(np.diff(v) / dt / (1024*1024), 4).tolist()
+        return r if first else [0] + r
+
+    return {
+        'cpu': np.round(np.frombuffer(cols['cpu_avg'], dtype=np.float64)[first:], 2).tolist(),
+        'memory': np.round(np.frombuffer(cols['mem_percent'], dtype=np.float32)[first:].astype(np.float64), 2).tolist(),
+        'net_rx': rate(cols['bytes_recv']),
+        'net_tx': rate(cols['bytes_sent']),
+    }
+
+
+def to_list(v, ndigits):
+    """Round an array for JSON, with None for NaN."""
+    return [None if math.isnan(x) else x for x in np.round(v, ndigits).tolist()]
@@ -0,0 +1,364 @@
+import collections
+import json
+import os
+import re
+import subprocess
+import threading
+import urllib.request
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from aggregate import parse_bucket
+
+# <metric> [rate] [<agg> over <window>] <op> <threshold> [for <duration>]
+#   cpu.avg > 90 for 5m
+#   disk['/'].percent > 85
+#   net_rx rate p95 over 10m > 50
+RULE_RE = re.compile(
+    r"""^\s*(?P<metric>cpu(?:\.avg)?|memory(?:\.percent)?|net_rx|net_tx|disk\[(?P<q>['"])(?P<mount>.+?)(?P=q)\]\.(?P<field>percent|used|free|total))
+        (?P<rate>\s+rate)?
+        (?:\s+(?P<agg>avg|min|max|p\d{1,2})\s+over\s+(?P<window>\d+[smhd]))?
+        \s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<threshold>-?\d+(?:\.\d+)?)
+        (?:\s+for\s+(?P<for>\d+[smhd]))?\s*$""",
+    re.VERBOSE
+)
+OPS = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+# metrics derived from monotonic counters; `rate` is only meaningful on these
+COUNTERS = ('net_rx', 'net_tx')
+
+
+class WindowAvg:
+    """Mean over the last `seconds`: a deque and a running sum."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._items = collections.deque()
+        self._sum = 0.0
+
+    def add(self, t, v):
+        self._items.append((t, v))
+        self._sum += v
+        while self._items[0][0] <= t - self.seconds:
+            self._sum -= self._items.popleft()[1]
+        return self._sum / len(self._items)
+
+
+class WindowExtreme:
+    """Min or max over the last `seconds` with a monotonic deque (amortized O(1))."""
+
+    def __init__(self, seconds, largest):
+        self.seconds = seconds
+        self.largest = largest
+        self._items = collections.deque()
+
+    def add(self, t, v):
+        items = self._items
+        if self.largest:
+            while items and items[-1][1] <= v:
+                items.pop()
+        else:
+            while items and items[-1][1] >= v:
+                items.pop()
+        items.append((t, v))
+        while items[0][0] <= t - self.seconds:
+            items.popleft()
+        return items[0][1]
+
+
+class WindowQuantile:
+    """q-quantile over the last `seconds`: arrival deque plus a chunked sorted list.
+
+    Values are kept in sorted chunks of at most 2 * LOAD items, located by
+    bisecting the chunk maxima, so inserting or expiring a value costs
+    O(log n + LOAD) and the rank lookup walks O(n / LOAD) chunk lengths,
+    instead of the O(n) list shift of a single sorted list.
+    """
+
+    LOAD = 64
+
+    def __init__(self, seconds, q):
+        self.seconds = seconds
+        self.q = q
+        self._items = collections.deque()
+        self._chunks = []
+        self._maxes = []
+
+    def _insert(self, v):
+        chunks, maxes = self._chunks, self._maxes
+        if not chunks:
+            chunks.append([v])
+            maxes.append(v)
+            return
+        i = min(bisect_left(maxes, v), len(chunks) - 1)
+        chunk = chunks[i]
+        insort(chunk, v)
+        maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self.LOAD:
+            half = chunk[self.LOAD:]
+            del chunk[self.LOAD:]
+            maxes[i] = chunk[-1]
+            chunks.insert(i + 1, half)
+            maxes.insert(i + 1, half[-1])
+
+    def _remove(self, v):
+        chunks, maxes = self._chunks, self._maxes
+        i = bisect_left(maxes, v)
+        chunk = chunks[i]
+        del chunk[bisect_left(chunk, v)]
+        if chunk:
+            maxes[i] = chunk[-1]
+        else:
+            del chunks[i], maxes[i]
+
+    def _at(self, k):
+        for chunk in self._chunks:
+            if k < len(chunk):
+                return chunk[k]
+            k -= len(chunk)
+        raise IndexError(k)
+
+    def add(self, t, v):
+        self._items.append((t, v))
+        self._insert(v)
+        while self._items[0][0] <= t - self.seconds:
+            self._remove(self._items.popleft()[1])
+        n = len(self._items)
+        return self._at(min(n - 1, int(self.q * n)))
+
+
+def _window(agg, seconds):
+    if agg == 'avg':
+        return WindowAvg(seconds)
+    if agg in ('min', 'max'):
+        return WindowExtreme(seconds, largest=(agg == 'max'))
+    return WindowQuantile(seconds, int(agg[1:]) / 100)
+
+
+class Rule:
+    """One parsed alert rule and its state (ok, pending or firing)."""
+
+    def __init__(self, name, expr, severity='warning'):
+        m = RULE_RE.match(expr)
+        if not m:
+            raise ValueError(f'invalid alert rule: {expr!r}')
+        if m.group('rate') and m.group('metric') not in COUNTERS:
+            raise ValueError(f'invalid alert rule: {expr!r}: rate only applies to {", ".join(COUNTERS)}')
+        self.name = name
+        self.expr = expr
+        self.severity = severity
+        if m.group('mount') is not None:
+            self.metric = ('disk', m.group('mount'), m.group('field'))
+        else:
+            self.metric = m.group('metric').split('.')[0]
+        self.agg = m.group('agg')
+        self.window = parse_bucket(m.group('window')) if self.agg else None
+        self.op = OPS[m.group('op')]
+        self.threshold = float(m.group('threshold'))
+        self.duration = parse_bucket(m.group('for')) if m.group('for') else 0
+        self.state = 'ok'
+        self.value = None
+        self.since = None
+
+    @property
+    def series(self):
+        """Key of the (metric, aggregation, window) value this rule compares."""
+        return (self.metric, self.agg, self.window)
+
+    def status(self):
+        return {
+            'name': self.name,
+            'expr': self.expr,
+            'severity': self.severity,
+            'state': self.state,
+            'value': self.value,
+            'since': datetime.fromtimestamp(self.since).isoformat() + 'Z' if self.since else None,
+        }
+
+
+class AlertEngine:
+    """Evaluate alert rules incrementally on every sample.
+
+    Metric values are extracted once per sample and each distinct
+    (metric, aggregation, window) is maintained by one sliding-window
+    structure shared by all rules that use it, so a sample costs one window
+    update per distinct series plus one comparison per rule. Transitions to
+    firing and back to ok are handed to the notifiers on a background thread.
+    """
+
+    def __init__(self, rules=(), notifiers=(), history=100):
+        self.rules = []
+        self.notifiers = list(notifiers)
+        self.events = collections.deque(maxlen=history)
+        self._windows = {}
+        self._metrics = set()
+        self._prev_net = None
+        self._lock = threading.Lock()
+        self._notify_pool = ThreadPoolExecutor(max_workers=1)
+        for rule in rules:
+            self.add_rule(**rule)
+
+    def add_rule(self, name, expr, severity='warning'):
+        rule = Rule(name, expr, severity)
+        with self._lock:
+            self.rules.append(rule)
+            self._metrics.add(rule.metric)
+            if rule.agg and rule.series not in self._windows:
+                self._windows[rule.series] = _window(rule.agg, rule.window)
+        return rule
+
+    def _extract(self, snapshot):
+        """{metric: value} for the metrics the rules use; net rates in MB/s."""
+        t = snapshot['t']
+        net = snapshot.get('net') or {}
+        recv, sent = net.get('bytes_recv'), net.get('bytes_sent')
+        rx = tx = None
+        if self._prev_net is not None and recv is not None and sent is not None:
+            pt, precv, psent = self._prev_net
+            dt = t - pt
+            if dt > 0 and recv >= precv and sent >= psent:
+                rx = (recv - precv) / dt / (1024*1024)
+                tx = (sent - psent) / dt / (1024*1024)
+        if recv is not None and sent is not None:
+            self._prev_net = (t, recv, sent)
+
+        values = {}
+        for metric in self._metrics:
+            if metric == 'cpu':
+                values[metric] = (snapshot.get('cpu') or {}).get('avg')
+            elif metric == 'memory':
+                values[metric] = (snapshot.get('memory') or {}).get('percent')
+            elif metric == 'net_rx':
+                values[metric] = rx
+            elif metric == 'net_tx':
+                values[metric] = tx
+            else:
+                _, mount, field = metric
+                values[metric] = ((snapshot.get('disk') or {}).get(mount) or {}).get(field)
+        return values
+
+    def evaluate(self, snapshot):
+        """Feed one snapshot to every rule; returns the list of events it produced."""
+        t = snapshot['t']
+        fired = []
+        with self._lock:
+            values = self._extract(snapshot)
+            series = {}
+            for key, window in self._windows.items():
+                v = values.get(key[0])
+                if v is not None:
+                    series[key] = window.add(t, v)
+            for rule in self.rules:
+                v = series.get(rule.series) if rule.agg else values.get(rule.metric)
+                if v is None:
+                    continue
+                rule.value = v
+                if rule.op(v, rule.threshold):
+                    if rule.state == 'ok':
+                        rule.state = 'pending'
+                        rule.since = t
+                    if rule.state == 'pending' and t - rule.since >= rule.duration:
+                        rule.state = 'firing'
+                        fired.append(self._event(rule, 'firing', t))
+                elif rule.state != 'ok':
+                    if rule.state == 'firing':
+                        fired.append(self._event(rule, 'resolved', t))
+                    rule.state = 'ok'
+                    rule.since = None
+        for event in fired:
+            self.events.append(event)
+            self._notify_pool.submit(self._notify, event)
+        return fired
+
+    @staticmethod
+    def _event(rule, state, t):
+        return {
+            'rule': rule.name,
+            'expr': rule.expr,
+            'severity': rule.severity,
+            'state': state,
+            'value': rule.value,
+            'ts': datetime.fromtimestamp(t).isoformat() + 'Z',
+        }
+
+    def _notify(self, event):
+        for notifier in self.notifiers:
+            try:
+                notifier.send(event)
+            except Exception as e:
+                print(f'Alert notifier {type(notifier).__name__} error:', e)
+
+    def status(self):
+        """Rules with their current state and the most recent events, newest first."""
+        with self._lock:
+            rules = [rule.status() for rule in self.rules]
+        return {'rules': rules, 'events': list(reversed(self.events))}
+
+
+class WebhookNotifier:
+    """POST each event as JSON to a URL."""
+
+    def __init__(self, url, timeout=5, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+
+    def send(self, event):
+        req = urllib.request.Request(
+            self.url, data=json.dumps(event).encode(), method='POST',
+            headers={'Content-Type': 'application/json', **self.headers}
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class FileNotifier:
+    """Append each event as one JSON line to a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, event):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+
+class CommandNotifier:
+    """Run a shell command per event, with the event as JSON on stdin and ALERT_* variables."""
+
+    def __init__(self, command, timeout=30):
+        self.command = command
+        self.timeout = timeout
+
+    def send(self, event):
+        env = dict(os.environ, ALERT_RULE=event['rule'], ALERT_STATE=event['state'],
+                   ALERT_SEVERITY=event['severity'], ALERT_VALUE=str(event['value']))
+        subprocess.run(self.command, shell=True, input=json.dumps(event), text=True,
+                       env=env, timeout=self.timeout, check=False)
+
+
+NOTIFIERS = {'webhook': WebhookNotifier, 'file': FileNotifier, 'command': CommandNotifier}
+
+
+def load_alerts(path):
+    """Build an AlertEngine from a JSON file:
+    {"rules": [{"name", "expr", "severity"}],
+     "notifiers": [{"type": "webhook", "url"} | {"type": "file", "path"} | {"type": "command", "command"}]}
+    """
+    with open(path) as f:
+        config = json.load(f)
+    notifiers = []
+    for entry in config.get('notifiers', []):
+        entry = dict(entry)
+        kind = entry.pop('type', None)
+        if kind not in NOTIFIERS:
+            raise ValueError(f'unknown notifier type: {kind!r}')
+        notifiers.append(NOTIFIERS[kind](**entry))
+    return AlertEngine(config.get('rules', []), notifiers)
@@ -1,7 +1,19 @@
+import atexit
 import os
+import signal
+import sys
 from functools import wraps
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for
+from flask import Flask, Response, jsonify, render_template, request, session, redirect, url_for
 from monitor import SystemMonitor
+from alerts import load_alerts
+import aggregate
+import compact
+import export
+import instrument
+import psutil
+import socket
+import time
+from devices import KINDS as DEVICE_KINDS
 import paramiko
 from datetime import datetime, timedelta
 
@@ -13,7 +25,91 @@ app.secret_key = os.environ.get('DASH_SECRET_KEY', 'change-this-secret')
 WEB_USER = os.environ.get('DASH_USER', 'admin')
 WEB_PASS = os.environ.get('DASH_PASS', 'admin')
 
-monitor = SystemMonitor()
+# systemd units shown on the services page: comma-separated list in MONITOR_SERVICES
+SERVICES = os.environ.get('MONITOR_SERVICES')
+
+# optional alert rules and notifiers: MONITOR_ALERTS points at a JSON file (see alerts.load_alerts)
+ALERTS_CONFIG = os.environ.get('MONITOR_ALERTS')
+
+# interface name prefixes without per-device rates: comma-separated list in MONITOR_SKIP_NICS
+SKIP_NICS = os.environ.get('MONITOR_SKIP_NICS')
+
+# MONITOR_ROLE=replica for multi-worker deployments: workers follow the shared-memory
+# segment written by sampler.py (MONITOR_SHM) and read the DB (MONITOR_DB) read-only
+monitor = SystemMonitor(
+    # replicas must match the sampler's interval (sampler.py) to size their history
+    sample_interval=int(os.environ.get('MONITOR_INTERVAL', 60)),
+    storage_path=os.environ.get('MONITOR_DB', 'monitor.db'),
+    services=[s.strip() for s in SERVICES.split(',') if s.strip()] if SERVICES else None,
+    role=os.environ.get('MONITOR_ROLE', 'standalone'),
+    shm_path=os.environ.get('MONITOR_SHM'),
+    # MONITOR_BURST=0 turns off adaptive burst sampling
+    burst_sampling=os.environ.get('MONITOR_BURST', '1') != '0',
+    alerts=load_alerts(ALERTS_CONFIG) if ALERTS_CONFIG else None,
+    skip_nics=[s.strip() for s in SKIP_NICS.split(',') if s.strip()] if SKIP_NICS else None
+)
+
+# optional fleet mode: MONITOR_FLEET points at a JSON host registry (see fleet.load_hosts).
+# Replicas only read the per-host files; sampler.py polls the hosts and writes them
+FLEET_CONFIG = os.environ.get('MONITOR_FLEET')
+fleet = None
+if FLEET_CONFIG:
+    from fleet import FleetCollector, load_hosts
+    fleet = FleetCollector(
+        load_hosts(FLEET_CONFIG),
+        storage_dir=os.environ.get('MONITOR_FLEET_DIR', 'fleet'),
+        role='replica' if monitor.role == 'replica' else 'standalone'
+    )
+
+
+@atexit.register
+def close_stores():
+    """Write the samples still buffered for SQLite (up to flush_interval worth) on shutdown."""
+    monitor.close()
+    if fleet:
+        for store in fleet.stores.values():
+            store.close()
+
+
+def metrics_for(host):
+    """MetricStore for the `host` query parameter: the local monitor when empty, None if unknown."""
+    if not host:
+        return monitor
+    return fleet.store(host) if fleet else None
+
+
+# bearer token Prometheus can scrape /metrics with; without it /metrics needs a login session
+METRICS_TOKEN = os.environ.get('MONITOR_METRICS_TOKEN')
+
+
+@app.before_request
+def start_timer():
+    request.started = time.perf_counter()
+
+
+@app.after_request
+def record_duration(resp):
+    started = getattr(request, 'started', None)
+    if started is not None and request.endpoint:
+        instrument.HTTP_SECONDS.observe(time.perf_counter() - started, request.endpoint)
+    return resp
+
+
+@app.after_request
+def compress_response(resp):
+    """gzip / brotli (when installed) JSON and binary responses, per Accept-Encoding."""
+    if (resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed
+            or 'Content-Encoding' in resp.headers
+            or resp.mimetype not in ('application/json', compact.MIMETYPE)):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    encoding = compact.choose_encoding(request.accept_encodings)
+    data = resp.get_data()
+    if encoding is None or len(data) < compact.MIN_COMPRESS_SIZE:
+        return resp
+    resp.set_data(compact.compress(data, encoding))
+    resp.headers['Content-Encoding'] = encoding
+    return resp
 
 
 def login_required(f):
@@ -54,23 +150,19 @@ def logout():
 @app.route('/stats')
 @login_required
 def get_stats():
-    return jsonify({
-        'cpu': monitor.get_cpu_info(),
-        'memory': monitor.get_memory_info(),
-        'disk': monitor.get_disk_info(),
-        'network': monitor.get_network_info()
-    })
+    store = metrics_for(request.args.get('host'))
+    if store is None:
+        return jsonify({'error': 'unknown host'}), 404
+    return jsonify(store.get_stats())
 
 
-@app.route('/history')
-@login_required
-def get_history():
-    """Return time series. Accepts either `range` param with values: today, yesterday, 7d
-    or `start` and `end` ISO timestamps (UTC) e.g. 2025-10-29T00:00:00Z
+def parse_range(args):
+    """(start, end) datetimes from `range` (today, yesterday, 7d) or ISO `start`/`end`
+    query parameters; the last 24 hours by default. None if start/end are invalid.
     """
-    rng = request.args.get('range')
-    start = request.args.get('start')
-    end = request.args.get('end')
+    rng = args.get('range')
+    start = args.get('start')
+    end = args.get('end')
     now = datetime.utcnow()
 
     def parse_iso(s):
@@ -105,20 +197,304 @@ def get_history():
             start_dt = sdt
             end_dt = edt
         else:
-            return jsonify({'error': 'invalid start/end format'}), 400
+            return None
     else:
         # default last 24 hours
         start_dt = now - timedelta(days=1)
         end_dt = now
 
-    series = monitor.get_time_series(start_dt, end_dt)
-    return jsonify(series)
+    return start_dt, end_dt
+
+
+@app.route('/history')
+@login_required
+def get_history():
+    """Return time series. Accepts either `range` param with values: today, yesterday, 7d
+    or `start` and `end` ISO timestamps (UTC) e.g. 2025-10-29T00:00:00Z
+
+    Optional: `max_points` (int) picks a rollup tier and LTTB-downsamples to that many
+    points (`downsample=none` to disable), `resolution` forces raw/1m/5m/1h
+    (or burst: the sub-second samples recorded while burst triggers fired),
+    `since` (epoch cursor from a previous response's `cursor`) returns only newer points,
+    `host` selects a fleet host instead of the local machine.
+    `agg` (min, avg, max, p50, p95, p99, ma) with `bucket` (e.g. 30s, 5m, 1h; default 5m)
+    returns bucketed statistics of the raw samples instead, including a `disk` series;
+    `window` sets the number of buckets averaged by `ma` (default 5).
+    `metric=disk_io` or `metric=net_io` with `device` (e.g. sda, eth0) returns that block
+    device's or interface's rates instead (IOPS, MB/s, await, utilization / packets,
+    errors, drops per second); without `device` the known devices are listed.
+
+    `format=bin` (or `Accept: application/vnd.sysmon.series`) returns the compact
+    binary encoding from compact.pack_series instead of JSON.
+
+    Responses carry an ETag derived from the newest sample of the data served
+    (the burst tier's newest row for resolution=burst); a matching
+    If-None-Match gets a 304 without building the series. Burst responses
+    read from SQLite (replicas) carry no ETag.
+    """
+    store = metrics_for(request.args.get('host'))
+    if store is None:
+        return jsonify({'error': 'unknown host'}), 404
+    rng = parse_range(request.args)
+    if rng is None:
+        return jsonify({'error': 'invalid start/end format'}), 400
+    start_dt, end_dt = rng
+
+    max_points = request.args.get('max_points')
+    if max_points is not None:
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            return jsonify({'error': 'invalid max_points'}), 400
+        if max_points <= 0:
+            return jsonify({'error': 'invalid max_points'}), 400
+    resolution = request.args.get('resolution')
+    if resolution and resolution not in ('raw', 'burst') and resolution not in store.rollups.tiers:
+        return jsonify({'error': 'invalid resolution'}), 400
+    downsample = request.args.get('downsample', 'lttb')
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = float(since)
+        except ValueError:
+            return jsonify({'error': 'invalid since'}), 400
+    metric = request.args.get('metric')
+    device = request.args.get('device')
+    if metric is not None:
+        if metric not in DEVICE_KINDS:
+            return jsonify({'error': 'invalid metric'}), 400
+        if not device:
+            return jsonify({'error': 'device required', 'devices': store.device_names()[metric]}), 400
+    agg = request.args.get('agg')
+    if agg is not None:
+        if agg not in aggregate.AGGS:
+            return jsonify({'error': 'invalid agg'}), 400
+        bucket = aggregate.parse_bucket(request.args.get('bucket', '5m'))
+        if bucket is None:
+            return jsonify({'error': 'invalid bucket'}), 400
+        try:
+            window = int(request.args.get('window', 5))
+        except ValueError:
+            return jsonify({'error': 'invalid window'}), 400
+        if window <= 0:
+            return jsonify({'error': 'invalid window'}), 400
+        if not aggregate.available():
+            return jsonify({'error': 'aggregation requires numpy'}), 501
+
+    binary = (request.args.get('format') == 'bin'
+              or request.accept_mimetypes.best_match([compact.MIMETYPE, 'application/json']) == compact.MIMETYPE)
+
+    # weak, so it survives the response being compressed
+    if resolution == 'burst' and agg is None and metric is None:
+        # burst rows arrive between samples, so compare the burst tier's newest row; replicas
+        # read them from SQLite and have nothing cheap to compare, so they send no ETag
+        etag = f"s{'b' if binary else ''}{store.burst.tier.last_time()}" if store.burst else None
+    else:
+        etag = f"h{'b' if binary else ''}{resolution or ''}{store.latest_sample_time()}"
+    if etag and request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+
+    with instrument.HISTORY_SECONDS.time('build'):
+        if metric is not None:
+            series = store.get_device_series(metric, device, start_dt, end_dt, max_points=max_points,
+                                             downsample=downsample, since=since, with_times=binary)
+        elif agg is not None:
+            series = store.get_aggregate_series(start_dt, end_dt, agg=agg, bucket=bucket, window=window,
+                                                since=since, with_times=binary)
+        else:
+            series = store.get_time_series(start_dt, end_dt, max_points=max_points,
+                                             resolution=resolution, downsample=downsample, since=since,
+                                             with_times=binary)
+    with instrument.HISTORY_SECONDS.time('serialize'):
+        if binary:
+            resp = Response(compact.pack_series(series), mimetype=compact.MIMETYPE)
+        else:
+            resp = jsonify(series)
+    if etag:
+        resp.set_etag(etag, weak=True)
+    # let browsers cache but always revalidate with If-None-Match
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.vary.add('Accept')
+    return resp
+
+@app.route('/history/percpu')
+@login_required
+def get_percpu_history():
+    """Per-core CPU heatmap: `columns` time buckets (default 300) by core, each cell the
+    `agg` (avg or max) utilization in whole percent. Same `range` / `start` / `end` /
+    `host` parameters as /history.
+    """
+    store = metrics_for(request.args.get('host'))
+    if store is None:
+        return jsonify({'error': 'unknown host'}), 404
+    rng = parse_range(request.args)
+    if rng is None:
+        return jsonify({'error': 'invalid start/end format'}), 400
+    try:
+        columns = int(request.args.get('columns', 300))
+    except ValueError:
+        return jsonify({'error': 'invalid columns'}), 400
+    if not 1 <= columns <= 5000:
+        return jsonify({'error': 'invalid columns'}), 400
+    agg = request.args.get('agg', 'avg')
+    if agg not in ('avg', 'max'):
+        return jsonify({'error': 'invalid agg'}), 400
+    if not aggregate.available():
+        return jsonify({'error': 'aggregation requires numpy'}), 501
+
+    etag = f'p{store.latest_sample_time()}'
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+    resp = jsonify(store.get_percpu_heatmap(*rng, columns=columns, agg=agg))
+    resp.set_etag(etag, weak=True)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.route('/summary')
+@login_required
+def get_summary():
+    """min / avg / max / p50 / p95 / p99 / last of cpu, memory, net_rx, net_tx and disk
+    over a range (same `range` / `start` / `end` / `host` parameters as /history).
+    """
+    store = metrics_for(request.args.get('host'))
+    if store is None:
+        return jsonify({'error': 'unknown host'}), 404
+    rng = parse_range(request.args)
+    if rng is None:
+        return jsonify({'error': 'invalid start/end format'}), 400
+    if not aggregate.available():
+        return jsonify({'error': 'aggregation requires numpy'}), 501
+    return jsonify(store.get_summary(*rng))
+
+@app.route('/export')
+@login_required
+def export_history():
+    """Stream stored samples for analytics tools, straight from SQLite.
+
+    `format`: csv (default), ndjson, parquet or arrow (an Arrow IPC stream; both need
+    pyarrow, 501 without it). `metrics`: comma-separated subset of export.METRICS
+    (default cpu, memory, net_rx, net_tx, disk). `host`: comma-separated fleet hosts,
+    empty for the local machine. Same `range` / `start` / `end` parameters as /history.
+    Rows are read a chunk at a time as the response is sent, so any range can be exported.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': 'invalid format'}), 400
+    if not export.available(fmt):
+        return jsonify({'error': f'{fmt} export requires pyarrow'}), 501
+    metrics = request.args.get('metrics')
+    metrics = tuple(m.strip() for m in metrics.split(',') if m.strip()) if metrics else export.DEFAULT_METRICS
+    if not metrics or any(m not in export.METRICS for m in metrics):
+        return jsonify({'error': 'invalid metrics', 'metrics': list(export.METRICS)}), 400
+    rng = parse_range(request.args)
+    if rng is None:
+        return jsonify({'error': 'invalid start/end format'}), 400
+
+    sources = []
+    for host in dict.fromkeys(h.strip() for h in request.args.get('host', '').split(',')):
+        store = metrics_for(host)
+        if store is None:
+            return jsonify({'error': 'unknown host', 'host': host}), 404
+        chunks = store.export_rows(*rng, metrics=metrics)
+        if chunks is None:
+            return jsonify({'error': 'no stored history', 'host': host}), 503
+        sources.append((host or socket.gethostname(), chunks))
+
+    tagged = ((name, chunk) for name, chunks in sources for chunk in chunks)
+    return Response(
+        export.encode(fmt, metrics, tagged),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="sysmon-export.{fmt}"'}
+    )
+
+@app.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events: one `sample` event per sampler tick.
+
+    Browsers reconnect with a `Last-Event-ID` header and receive the samples
+    they missed (within the broadcaster's backlog).
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = float(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    return Response(
+        monitor.events.stream(last_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/fleet')
+@login_required
+def get_fleet():
+    """Registered fleet hosts with their last sample time and last collection error."""
+    return jsonify(fleet.status() if fleet else {})
+
+@app.route('/alerts')
+@login_required
+def get_alerts():
+    """Alert rules with their state (ok, pending, firing) and the latest firing / resolved events."""
+    if monitor.alerts is None:
+        return jsonify({'rules': [], 'events': []})
+    return jsonify(monitor.alerts.status())
+
+@app.route('/health')
+@login_required
+def get_health():
+    """Startup timings, history hydration state, the last retention run and collector timings."""
+    return jsonify({
+        'role': monitor.role,
+        'history_warm': monitor.history_warm.is_set(),
+        'samples': len(monitor.history),
+        'startup': monitor.startup,
+        'retention': monitor.last_retention,
+        'burst': monitor.burst.status() if monitor.burst else None,
+        'collectors': monitor.collectors.status() if monitor.collectors else None
+    })
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text format: the monitor's own timings and sizes plus the latest host sample."""
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}' and not session.get('logged_in'):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+    elif not session.get('logged_in'):
+        return redirect(url_for('login', next=request.path))
+    proc = psutil.Process()
+    cpu = proc.cpu_times()
+    extra = monitor.metrics_lines()
+    extra += instrument.family('process_resident_memory_bytes', 'Resident memory of this process.',
+                               proc.memory_info().rss)
+    extra += instrument.family('process_cpu_seconds_total', 'CPU time used by this process.',
+                               cpu.user + cpu.system, kind='counter')
+    if monitor.collectors:
+        status = monitor.collectors.status()
+        extra += instrument.family('sysmon_collector_timeouts_total', 'Collector calls that overran their timeout.',
+                                   [((name,), c['timeouts']) for name, c in status.items()], ('collector',),
+                                   kind='counter')
+    return Response(instrument.render(extra), mimetype='text/plain; version=0.0.4')
 
 @app.route('/services')
 @login_required
 def get_services():
     return jsonify(monitor.get_service_status())
 
+@app.route('/processes')
+@login_required
+def get_processes():
+    """Top processes by CPU and RSS (`n`, default 10) and Python worker groups."""
+    try:
+        n = max(1, min(int(request.args.get('n', 10)), 100))
+    except ValueError:
+        return jsonify({'error': 'invalid n'}), 400
+    return jsonify(monitor.processes.summary(n))
+
 @app.route('/services/page')
 @login_required
 def services_page():
@@ -148,4 +524,7 @@ def control_service():
         return str(e), 500
 
 if __name__ == '__main__':
+    # exit normally on SIGTERM (systemd stop) so close_stores runs; under gunicorn
+    # the server handles signals and its workers still run atexit hooks
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
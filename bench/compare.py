@@ -0,0 +1,70 @@
+"""Compare two bench/run.py result files.
+
+    python bench/compare.py before.json after.json [--threshold 10]
+
+Prints every shared measurement with its change in percent and marks the ones
+that got worse by more than the threshold; exits with status 1 if any did.
+"""
+import argparse
+import json
+import sys
+
+# lower is better for these keys, higher is better for these; min / max / p99 latencies
+# are too noisy between runs to compare
+LOWER = ('p50_ms', 'p95_ms', 'ready_seconds', 'hydrated_seconds', 'bytes', 'bytes_per_sample', 'db_bytes')
+HIGHER = ('samples_per_second', 'requests_per_second')
+
+
+def flatten(results, prefix=''):
+    out = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            out.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def direction(name):
+    """1 if larger values are worse, -1 if smaller values are worse, 0 if neither."""
+    key = name.rsplit('.', 1)[-1]
+    if key in HIGHER:
+        return -1
+    if key in LOWER:
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change counted as a regression')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before['meta'].get('params') != after['meta'].get('params'):
+        print('warning: the runs used different parameters', file=sys.stderr)
+
+    old, new = flatten(before['results']), flatten(after['results'])
+    regressions = 0
+    print(f'{before["meta"].get("version")} -> {after["meta"].get("version")}')
+    for name in sorted(old.keys() & new.keys()):
+        sign = direction(name)
+        if not sign:
+            continue
+        a, b = old[name], new[name]
+        change = (b - a) / a * 100 if a else 0.0
+        worse = change * sign > args.threshold
+        regressions += worse
+        print(f'{"!" if worse else " "} {name:60} {a:>14} {b:>14} {change:+8.1f}%')
+    print(f'{regressions} regression(s) over {args.threshold}%')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
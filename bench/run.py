@@ -0,0 +1,324 @@
+"""Benchmarks of the history, storage and HTTP paths on synthetic data.
+
+    python bench/run.py --days 7 --interval 60 --cores 64 --mounts 4 --out before.json
+    python bench/compare.py before.json after.json
+
+Measures memory per sample, ingest throughput (in memory and with SQLite),
+range-query latency, startup hydration from the DB and endpoint latency
+through the Flask test client with concurrent clients. Results are written
+as JSON (see README, "Benchmarks"); progress goes to stderr.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aggregate  # noqa: E402
+from monitor import MetricStore  # noqa: E402
+from synthetic import snapshots  # noqa: E402
+
+SECTIONS = ('memory', 'ingest', 'query', 'db', 'http')
+
+
+def log(*args):
+    print(*args, file=sys.stderr, flush=True)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def latency(samples):
+    """Summary of durations in seconds, reported in milliseconds."""
+    s = sorted(samples)
+    return {
+        'runs': len(s),
+        'min_ms': round(s[0] * 1000, 3),
+        'p50_ms': round(percentile(s, 50) * 1000, 3),
+        'p95_ms': round(percentile(s, 95) * 1000, 3),
+        'p99_ms': round(percentile(s, 99) * 1000, 3),
+        'max_ms': round(s[-1] * 1000, 3),
+    }
+
+
+def new_store(args, **kwargs):
+    return MetricStore(sample_interval=args.interval, max_days=args.days, **kwargs)
+
+
+def generate(args):
+    return snapshots(days=args.days, interval=args.interval, cores=args.cores, mounts=args.mounts,
+                     disks=args.disks, nics=args.nics, end=args.end, seed=args.seed)
+
+
+def ingest(store, args):
+    """Feed the synthetic series to store; (samples, seconds spent inside ingest)."""
+    n = 0
+    spent = 0.0
+    for snap in generate(args):
+        started = time.perf_counter()
+        store.ingest(snap)
+        spent += time.perf_counter() - started
+        n += 1
+    return n, spent
+
+
+def bench_memory(args):
+    """Python heap held by a MetricStore (history, rollups, device rates) per sample."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = new_store(args, persist=False)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    n, _ = ingest(store, args)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        'samples': n,
+        'capacity': store.history.maxlen,
+        'empty_bytes': allocated,
+        'bytes': held,
+        'bytes_per_sample': round(held / max(1, n), 1),
+    }
+
+
+def bench_ingest(args):
+    store = new_store(args, persist=False)
+    n, spent = ingest(store, args)
+    return store, {'samples': n, 'seconds': round(spent, 3), 'samples_per_second': round(n / spent, 1)}
+
+
+def bench_queries(store, args):
+    end = store.history.last_time()
+    ranges = {'1h': 3600, '1d': 86400, 'full': args.days * 86400}
+    disk = next(iter(store.device_names()['disk_io']), None)
+    cases = {}
+    for name, span in ranges.items():
+        start = end - span
+        cases[f'get_history.{name}'] = lambda s=start: store.get_history(s, end)
+        cases[f'get_time_series.raw.{name}'] = lambda s=start: store.get_time_series(s, end, resolution='raw')
+        cases[f'get_time_series.720.{name}'] = lambda s=start: store.get_time_series(s, end, max_points=720)
+        cases[f'get_time_series.raw_lttb720.{name}'] = (
+            lambda s=start: store.get_time_series(s, end, max_points=720, resolution='raw'))
+        if disk:
+            cases[f'get_device_series.720.{name}'] = (
+                lambda s=start: store.get_device_series('disk_io', disk, s, end, max_points=720))
+        if aggregate.available():
+            cases[f'get_aggregate_series.p95_5m.{name}'] = (
+                lambda s=start: store.get_aggregate_series(s, end, agg='p95', bucket=300))
+            cases[f'get_summary.{name}'] = lambda s=start: store.get_summary(s, end)
+            cases[f'get_percpu_heatmap.300.{name}'] = lambda s=start: store.get_percpu_heatmap(s, end, columns=300)
+    # a dashboard polling for new points
+    cases['get_time_series.since'] = lambda: store.get_time_series(since=end - 5 * args.interval)
+
+    results = {}
+    for name, call in cases.items():
+        first = call()
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - started)
+        results[name] = latency(samples)
+        if isinstance(first, dict) and 'resolution' in first:
+            # which tier served it: shows the automatic choice next to the forced raw cases
+            results[name]['resolution'] = first['resolution']
+        log(f'  {name}: p50 {results[name]["p50_ms"]} ms')
+    return results
+
+
+def bench_db(args, workdir):
+    """Ingest with persistence into a fresh DB, then time a cold start on it."""
+    path = os.path.join(workdir, 'bench.db')
+    store = new_store(args, storage_path=path, flush_interval=3600, flush_batch=1000)
+    n, spent = ingest(store, args)
+    started = time.perf_counter()
+    store.close()
+    spent += time.perf_counter() - started
+    out = {
+        'ingest_db': {'samples': n, 'seconds': round(spent, 3), 'samples_per_second': round(n / spent, 1),
+                      'db_bytes': sum(os.path.getsize(path + ext) for ext in ('', '-wal')
+                                      if os.path.exists(path + ext))},
+    }
+    log(f'  ingest_db: {out["ingest_db"]["samples_per_second"]} samples/s')
+
+    started = time.perf_counter()
+    store = new_store(args, storage_path=path, read_only=True)
+    ready = time.perf_counter() - started
+    store.history_warm.wait(args.timeout)
+    hydrated = time.perf_counter() - started
+    out['hydration'] = {
+        'samples': len(store.history),
+        'ready_seconds': round(ready, 3),
+        'hydrated_seconds': round(hydrated, 3),
+        'ready_samples': store.startup['ready_samples'],
+        'samples_per_second': round(len(store.history) / hydrated, 1) if hydrated else None,
+    }
+    log(f'  hydration: ready {ready:.3f}s, hydrated {hydrated:.3f}s')
+    return store, out
+
+
+def bench_http(store, args, workdir):
+    """Latency of the dashboard endpoints with `clients` concurrent Flask test clients."""
+    # app.py builds its own SystemMonitor on import; keep it away from the real DB and
+    # answer every request from the benchmark store instead
+    os.environ['MONITOR_DB'] = os.path.join(workdir, 'app.db')
+    os.environ['MONITOR_BURST'] = '0'
+    import app as webapp
+    webapp.monitor = store
+
+    end = store.history.last_time()
+
+    def window(span):
+        start = datetime.fromtimestamp(end - span).isoformat() + 'Z'
+        return f'start={start}&end={datetime.fromtimestamp(end).isoformat()}Z'
+
+    day, full = window(86400), window(args.days * 86400)
+    urls = {
+        'history.raw.1h': f'/history?{window(3600)}&resolution=raw',
+        'history.720.1d': f'/history?{day}&max_points=720',
+        'history.720.full': f'/history?{full}&max_points=720',
+        'history.bin.720.full': f'/history?{full}&max_points=720&format=bin',
+        'history.since': f'/history?{day}&since={end - 5 * args.interval}',
+    }
+    disk = next(iter(store.device_names()['disk_io']), None)
+    if disk:
+        urls['history.disk_io.720.1d'] = f'/history?{day}&metric=disk_io&device={disk}&max_points=720'
+    if aggregate.available():
+        urls['history.p95_5m.1d'] = f'/history?{day}&agg=p95&bucket=5m'
+        urls['history_percpu.1d'] = f'/history/percpu?{day}'
+        urls['summary.full'] = f'/summary?{full}'
+
+    clients = []
+    for _ in range(args.clients):
+        client = webapp.app.test_client()
+        with client.session_transaction() as s:
+            s['logged_in'] = True
+        clients.append(client)
+
+    def worker(client, url, count):
+        samples, errors, size = [], 0, 0
+        for _ in range(count):
+            started = time.perf_counter()
+            resp = client.get(url)
+            samples.append(time.perf_counter() - started)
+            if resp.status_code != 200:
+                errors += 1
+            size = len(resp.data)
+        return samples, errors, size
+
+    results = {}
+    per_client = max(1, args.requests // args.clients)
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for name, url in urls.items():
+            worker(clients[0], url, 1)
+            started = time.perf_counter()
+            done = list(pool.map(lambda c: worker(c, url, per_client), clients))
+            wall = time.perf_counter() - started
+            samples = [s for d in done for s in d[0]]
+            results[name] = latency(samples)
+            results[name].update({
+                'clients': args.clients,
+                'errors': sum(d[1] for d in done),
+                'bytes': done[0][2],
+                'requests_per_second': round(len(samples) / wall, 1),
+            })
+            log(f'  {name}: p50 {results[name]["p50_ms"]} ms, {results[name]["requests_per_second"]} req/s')
+    return results
+
+
+def version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=7, help='days of synthetic history (default 7)')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between samples, 1-60 (default 60)')
+    parser.add_argument('--cores', type=int, default=8, help='logical CPUs per sample (default 8)')
+    parser.add_argument('--mounts', type=int, default=3, help='mounted filesystems (default 3)')
+    parser.add_argument('--disks', type=int, default=2, help='block devices (default 2)')
+    parser.add_argument('--nics', type=int, default=2, help='network interfaces (default 2)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20, help='runs per query (default 20)')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent HTTP clients (default 8)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint (default 200)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for hydration')
+    parser.add_argument('--skip', default='', help=f'comma-separated sections to skip: {", ".join(SECTIONS)}')
+    parser.add_argument('--out', help='write results to this file instead of stdout')
+    args = parser.parse_args(argv)
+    skip = {s.strip() for s in args.skip.split(',') if s.strip()}
+    unknown = skip - set(SECTIONS)
+    if unknown:
+        parser.error(f'unknown sections: {", ".join(sorted(unknown))}')
+    # every pass replays the identical series
+    args.end = datetime.utcnow().timestamp()
+
+    params = {k: getattr(args, k) for k in ('days', 'interval', 'cores', 'mounts', 'disks', 'nics', 'seed',
+                                           'repeat', 'clients', 'requests')}
+    report = {
+        'meta': {
+            'version': version(),
+            'started': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': aggregate.available(),
+            'params': params,
+        },
+        'results': {},
+    }
+    results = report['results']
+    started = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix='sysmon-bench-')
+    try:
+        if 'memory' not in skip:
+            log('memory')
+            results['memory'] = bench_memory(args)
+            log(f'  {results["memory"]["bytes_per_sample"]} bytes/sample')
+        store = None
+        if 'ingest' not in skip or 'query' not in skip or ('http' not in skip and 'db' in skip):
+            log('ingest')
+            store, results['ingest'] = bench_ingest(args)
+            log(f'  {results["ingest"]["samples_per_second"]} samples/s')
+        if 'query' not in skip:
+            log('query')
+            results['query'] = bench_queries(store, args)
+        if 'db' not in skip:
+            log('db')
+            # endpoints are measured against the store loaded from the DB
+            store, db = bench_db(args, workdir)
+            results.update(db)
+        if 'http' not in skip:
+            log('http')
+            results['http'] = bench_http(store, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report['meta']['seconds'] = round(time.perf_counter() - started, 1)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+        log(f'results written to {args.out}')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
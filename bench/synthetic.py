@@ -0,0 +1,110 @@
+"""Synthetic snapshots shaped like SystemMonitor._take_snapshot output, without psutil.
+
+CPU and memory follow a daily cycle with noise and occasional spikes; network,
+disk I/O and per-interface counters grow monotonically; disk usage creeps up.
+The same seed always produces the same series.
+"""
+import math
+import random
+from datetime import datetime
+
+GB = 1024 ** 3
+
+
+def snapshots(days=7, interval=60, cores=8, mounts=3, disks=2, nics=2, end=None, seed=1):
+    """Yield snapshots every `interval` seconds for `days` days, oldest first, ending at `end`
+    (a naive-UTC epoch like the sampler's, default now).
+    """
+    rng = random.Random(seed)
+    end = datetime.utcnow().timestamp() if end is None else end
+    n = int(days * 86400 / interval)
+    start = end - (n - 1) * interval
+
+    mount_names = ['/'] + [f'/data{i}' for i in range(1, mounts)]
+    mount_total = {m: (64 + 128 * i) * GB for i, m in enumerate(mount_names)}
+    mount_used = {m: mount_total[m] * rng.uniform(0.2, 0.6) for m in mount_names}
+    disk_names = [f'sd{chr(ord("a") + i)}' for i in range(disks)]
+    nic_names = [f'eth{i}' for i in range(nics)]
+    disk_io = {d: dict.fromkeys(('read_count', 'write_count', 'read_bytes', 'write_bytes',
+                                 'read_time', 'write_time', 'busy_time'), 0) for d in disk_names}
+    nic_io = {n: dict.fromkeys(('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                                'errin', 'errout', 'dropin', 'dropout'), 0) for n in nic_names}
+    # a few cores run hotter, like a pinned workload
+    core_bias = [rng.uniform(-10, 10) + (30 if i % 7 == 3 else 0) for i in range(cores)]
+    mem_total = 32 * GB
+    bytes_sent = bytes_recv = 0
+
+    for i in range(n):
+        t = start + i * interval
+        day = math.sin(2 * math.pi * ((t % 86400) / 86400 - 0.25))
+        load = 35 + 25 * day + rng.gauss(0, 5) + (40 if rng.random() < 0.005 else 0)
+        percpu = [min(100.0, max(0.0, round(load + b + rng.gauss(0, 8), 1))) for b in core_bias]
+        mem_percent = min(99.0, max(5.0, 55 + 15 * day + rng.gauss(0, 2)))
+        mem_used = int(mem_total * mem_percent / 100)
+
+        rx = max(0.0, (2 + 1.5 * day + rng.expovariate(1.0)) * 1024 * 1024 * interval)
+        tx = rx * rng.uniform(0.2, 0.5)
+        bytes_recv += int(rx)
+        bytes_sent += int(tx)
+        for k, name in enumerate(nic_names):
+            c = nic_io[name]
+            share = 0.8 if k == 0 else 0.2 / max(1, nics - 1)
+            c['bytes_recv'] += int(rx * share)
+            c['bytes_sent'] += int(tx * share)
+            c['packets_recv'] += int(rx * share / 1200)
+            c['packets_sent'] += int(tx * share / 1200)
+            c['dropin'] += int(rng.random() < 0.01)
+        for name in disk_names:
+            c = disk_io[name]
+            reads = int(rng.uniform(5, 50) * interval)
+            writes = int(rng.uniform(10, 80) * interval)
+            c['read_count'] += reads
+            c['write_count'] += writes
+            c['read_bytes'] += reads * 16384
+            c['write_bytes'] += writes * 8192
+            c['read_time'] += int(reads * rng.uniform(0.2, 2))
+            c['write_time'] += int(writes * rng.uniform(0.5, 4))
+            c['busy_time'] += int(interval * 1000 * rng.uniform(0.05, 0.4))
+
+        disk = {}
+        for m in mount_names:
+            mount_used[m] = min(mount_total[m] * 0.98, mount_used[m] + rng.uniform(0, 2e5) * interval)
+            used = int(mount_used[m])
+            free = mount_total[m] - used
+            disk[m] = {
+                'device': f'/dev/{disk_names[0] if disk_names else "sda"}{mount_names.index(m) + 1}',
+                'total': mount_total[m],
+                'used': used,
+                'free': free,
+                'percent': round(used / mount_total[m] * 100, 1),
+                'fstype': 'ext4'
+            }
+
+        yield {
+            'ts': datetime.fromtimestamp(t).isoformat() + 'Z',
+            't': t,
+            'cpu': {
+                'avg': sum(percpu) / cores,
+                'percpu': percpu,
+                'frequency': {'current': 2400.0 + rng.uniform(-200, 800), 'min': 800.0, 'max': 3600.0},
+                'cores': max(1, cores // 2),
+                'logical_cores': cores
+            },
+            'memory': {
+                'total': mem_total,
+                'available': mem_total - mem_used,
+                'used': mem_used,
+                'percent': round(mem_percent, 1)
+            },
+            'swap': {'total': 4 * GB, 'used': GB // 8, 'free': 4 * GB - GB // 8, 'percent': 3.1},
+            'disk': disk,
+            'net': {
+                'bytes_sent': bytes_sent,
+                'bytes_recv': bytes_recv,
+                'packets_sent': bytes_sent // 1200,
+                'packets_recv': bytes_recv // 1200
+            },
+            'nics': {name: dict(c) for name, c in nic_io.items()},
+            'disk_io': {name: dict(c) for name, c in disk_io.items()},
+            'load': [load / 25, load / 27, load / 30]
+        }
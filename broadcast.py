@@ -0,0 +1,76 @@
+import collections
+import json
+import queue
+import threading
+
+
+class Broadcaster:
+    """Fan-out of server-sent events to any number of subscribers.
+
+    Each event is serialized once in `publish` and handed to every
+    subscriber's queue, so the cost per sample does not depend on what
+    subscribers do. A bounded backlog of recent events lets a reconnecting
+    client resume from its `Last-Event-ID`.
+    """
+
+    def __init__(self, backlog=600):
+        self._lock = threading.Lock()
+        self._backlog = collections.deque(maxlen=backlog)
+        self._subscribers = set()
+        # room for a full backlog replay on resume
+        self._queue_size = backlog
+
+    def publish(self, event_id, data, event='sample'):
+        """Send data (JSON-serializable) to all subscribers.
+
+        event_id must increase between calls; sample timestamps are used.
+        """
+        message = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+        with self._lock:
+            self._backlog.append((event_id, message))
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # slow client: drop the oldest message rather than block the sampler
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber and return its queue, pre-filled with missed events."""
+        q = queue.Queue(maxsize=self._queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event_id, message in self._backlog:
+                    if event_id > last_event_id:
+                        try:
+                            q.put_nowait(message)
+                        except queue.Full:
+                            break
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def stream(self, last_event_id=None, keepalive=15):
+        """Generator of SSE messages for one client; sends a comment line while idle."""
+        q = self.subscribe(last_event_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(q)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import psutil
+
+from history_store import _TimeIndex, _zeros
+
+COLUMNS = ('cpu', 'memory', 'net_rx', 'net_tx')
+
+
+class BurstTier:
+    """Ring buffer of high-resolution samples: t, cpu %, memory %, net rx/tx MB/s."""
+
+    def __init__(self, maxlen):
+        self.maxlen = max(1, int(maxlen))
+        self._lock = threading.Lock()
+        self._start = 0
+        self._count = 0
+        self._index = _TimeIndex(self)
+        self._t = _zeros('d', self.maxlen)
+        self._cols = {c: _zeros('f', self.maxlen) for c in COLUMNS}
+
+    def __len__(self):
+        return self._count
+
+    def _phys(self, index):
+        return (self._start + index) % self.maxlen
+
+    def push(self, row):
+        """Append a row dict with t and COLUMNS (None stored as NaN)."""
+        with self._lock:
+            if self._count < self.maxlen:
+                p = self._phys(self._count)
+                self._count += 1
+            else:
+                p = self._start
+                self._start = (self._start + 1) % self.maxlen
+            self._t[p] = float(row['t'])
+            for c in COLUMNS:
+                v = row.get(c)
+                self._cols[c][p] = math.nan if v is None else float(v)
+
+    def last_time(self):
+        """Timestamp of the newest row, or None when empty."""
+        with self._lock:
+            return self._t[self._phys(self._count - 1)] if self._count else None
+
+    def select(self, start, end):
+        """Return {'t': [...], <column>: [...]} for start <= t <= end, None for missing values."""
+        with self._lock:
+            lo = bisect_left(self._index, start)
+            hi = bisect_right(self._index, end, lo)
+            phys = [self._phys(i) for i in range(lo, hi)]
+            out = {'t': [self._t[p] for p in phys]}
+            for c in COLUMNS:
+                col = self._cols[c]
+                out[c] = [None if math.isnan(col[p]) else col[p] for p in phys]
+            return out
+
+
+class BurstSampler:
+    """Adaptive high-resolution sampling.
+
+    `probe()` is called every few seconds between the regular snapshots and
+    only reads the cheap system-wide counters (/proc/stat, meminfo, net/dev).
+    When a trigger fires -- CPU or memory above a threshold, or a network
+    rate jumping to net_factor times its moving average -- it switches to
+    burst mode: probes run every burst_interval seconds and each probe is
+    recorded as a high-resolution row. Burst mode lasts at least `hold`
+    seconds after the last trigger, then the interval doubles on every probe
+    until it is back at probe_interval.
+    """
+
+    def __init__(self, probe_interval=2.0, burst_interval=0.5, hold=30, cpu_threshold=85.0,
+                 memory_threshold=90.0, net_factor=4.0, net_min_rate=1.0, retention=86400, maxlen=100000):
+        """net_min_rate: MB/s a network rate must exceed to count as a jump.
+        retention: seconds of burst samples kept in the DB (the ring holds maxlen rows).
+        """
+        self.probe_interval = probe_interval
+        self.burst_interval = burst_interval
+        self.hold = hold
+        self.cpu_threshold = cpu_threshold
+        self.memory_threshold = memory_threshold
+        self.net_factor = net_factor
+        self.net_min_rate = net_min_rate
+        self.retention = retention
+        self.tier = BurstTier(maxlen)
+        self.interval = probe_interval
+        self._prev = None
+        self._net_avg = None
+        self._until = 0.0
+        self._pending = []
+        self.bursts = 0
+        self.last_trigger = None
+
+    @property
+    def active(self):
+        return self.interval < self.probe_interval
+
+    def _read(self):
+        """(t, busy, total, memory %, bytes_recv, bytes_sent) from the cheap counters."""
+        cpu = psutil.cpu_times()
+        # guest time is already part of user time
+        total = sum(cpu) - getattr(cpu, 'guest', 0) - getattr(cpu, 'guest_nice', 0)
+        idle = cpu.idle + getattr(cpu, 'iowait', 0)
+        net = psutil.net_io_counters()
+        return (datetime.utcnow().timestamp(), total - idle, total, psutil.virtual_memory().percent,
+                net.bytes_recv, net.bytes_sent)
+
+    def probe(self):
+        """Take one probe; returns the seconds to wait before the next one."""
+        cur = self._read()
+        prev, self._prev = self._prev, cur
+        if prev is None:
+            return self.interval
+        dt = cur[0] - prev[0]
+        if dt <= 0:
+            return self.interval
+        dtotal = cur[2] - prev[2]
+        row = {
+            't': cur[0],
+            'cpu': round(100.0 * (cur[1] - prev[1]) / dtotal, 2) if dtotal > 0 else None,
+            'memory': cur[3],
+            'net_rx': (cur[4] - prev[4]) / dt / (1024*1024) if cur[4] >= prev[4] else None,
+            'net_tx': (cur[5] - prev[5]) / dt / (1024*1024) if cur[5] >= prev[5] else None,
+        }
+
+        reason = self._trigger(row)
+        now = time.monotonic()
+        if reason:
+            if not self.active:
+                self.bursts += 1
+            self.last_trigger = {'reason': reason, 'ts': datetime.fromtimestamp(cur[0]).isoformat() + 'Z'}
+            self._until = now + self.hold
+            self.interval = self.burst_interval
+        elif self.active and now >= self._until:
+            # decay back to the baseline probe interval
+            self.interval = min(self.probe_interval, self.interval * 2)
+
+        if self.active or reason:
+            self.tier.push(row)
+            self._pending.append(row)
+        return self.interval
+
+    def _trigger(self, row):
+        """Name of the trigger this probe fires, or None. Also updates the network baseline."""
+        reason = None
+        if row['cpu'] is not None and row['cpu'] >= self.cpu_threshold:
+            reason = f"cpu {row['cpu']}%"
+        elif row['memory'] >= self.memory_threshold:
+            reason = f"memory {row['memory']}%"
+        rates = (row['net_rx'], row['net_tx'])
+        if None in rates:
+            return reason
+        if self._net_avg is not None and reason is None:
+            for name, rate, avg in zip(('net_rx', 'net_tx'), rates, self._net_avg):
+                if rate >= self.net_min_rate and rate >= self.net_factor * avg:
+                    reason = f'{name} {rate:.2f} MB/s'
+                    break
+        # slow moving average, so a sustained change stops triggering after a while
+        alpha = 0.05
+        self._net_avg = rates if self._net_avg is None else tuple(
+            a + alpha * (r - a) for r, a in zip(rates, self._net_avg)
+        )
+        return reason
+
+    def take_pending(self, batch=120):
+        """Recorded rows to persist: once `batch` have accumulated, and at the end of a burst."""
+        if not self._pending or (len(self._pending) < batch and self.active):
+            return []
+        pending, self._pending = self._pending, []
+        return pending
+
+    def status(self):
+        return {
+            'active': self.active,
+            'interval': self.interval,
+            'bursts': self.bursts,
+            'last_trigger': self.last_trigger,
+            'samples': len(self.tier),
+        }
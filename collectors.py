@@ -0,0 +1,328 @@
+import os
+import threading
+import time
+
+import psutil
+
+from instrument import COLLECTOR_SECONDS
+
+
+class Collector:
+    """One metric source: `func()` returns the value stored under `name` in each snapshot."""
+
+    def __init__(self, name, func, interval=None, timeout=5.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.value = None
+        self.started = None
+        self.collected_at = None
+        self.duration = None
+        self.error = None
+        self.timeouts = 0
+        self.thread = None
+
+    def due(self, now):
+        if self.thread is not None:
+            return False
+        return self.started is None or self.interval is None or now - self.started >= self.interval
+
+    def fresh(self):
+        """True when the value comes from the latest run.
+
+        A run that failed or is still hanging leaves an older value behind,
+        which must not be recorded as a new sample.
+        """
+        return self.collected_at is not None and self.collected_at >= self.started
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            self.value = self.func()
+            self.collected_at = time.monotonic()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+        self.duration = time.monotonic() - started
+        COLLECTOR_SECONDS.observe(self.duration, self.name)
+
+    def status(self, now):
+        return {
+            'interval': self.interval,
+            'timeout': self.timeout,
+            'age': round(now - self.collected_at, 3) if self.collected_at is not None else None,
+            'stale': self.collected_at is not None and not self.fresh(),
+            'duration': round(self.duration, 4) if self.duration is not None else None,
+            'running': self.thread is not None,
+            'timeouts': self.timeouts,
+            'error': self.error,
+        }
+
+
+class CollectorRegistry:
+    """Collectors with their own cadence and timeout, each run on a daemon thread.
+
+    Each `collect()` starts the collectors that are due (interval None means
+    every snapshot) and waits for each at most its timeout. A collector that
+    is still running -- a hung NFS mount in disk_usage, say -- is not started
+    again until it returns, so it holds at most one thread, and no more than
+    max_threads collector threads are alive at once. Until it returns, or
+    after it failed, the collector is left out of the snapshots. Collectors
+    that are not due contribute the value of their last successful run.
+    The threads are daemons, so a call that never returns does not keep the
+    process from exiting.
+    """
+
+    def __init__(self, max_threads=16):
+        self.collectors = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_threads)
+
+    def register(self, name, func, interval=None, timeout=5.0):
+        with self._lock:
+            self.collectors[name] = Collector(name, func, interval, timeout)
+
+    def _run(self, c):
+        try:
+            c.run()
+        finally:
+            self._slots.release()
+
+    def collect(self):
+        """Run the due collectors and return {name: value} for every collector with a fresh value."""
+        with self._lock:
+            collectors = list(self.collectors.values())
+        now = time.monotonic()
+        started = []
+        for c in collectors:
+            if c.thread is not None and not c.thread.is_alive():
+                c.thread = None
+            if c.due(now):
+                if not self._slots.acquire(blocking=False):
+                    # every slot is held by a hung collector
+                    c.error = 'no free collector thread'
+                    continue
+                thread = threading.Thread(target=self._run, args=(c,), name=f'collector-{c.name}', daemon=True)
+                try:
+                    thread.start()
+                except RuntimeError:
+                    # interpreter shutting down
+                    self._slots.release()
+                    break
+                c.thread = thread
+                c.started = now
+                started.append((c, thread))
+        for c, thread in started:
+            thread.join(max(0, now + c.timeout - time.monotonic()))
+            if thread.is_alive():
+                c.timeouts += 1
+                c.error = f'timed out after {c.timeout}s'
+            elif c.thread is thread:
+                c.thread = None
+        return {c.name: c.value for c in collectors if c.value is not None and c.fresh()}
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return {name: c.status(now) for name, c in self.collectors.items()}
+
+
+def collect_cpu():
+    # non-blocking: utilization since the previous call
+    percpu = psutil.cpu_percent(interval=None, percpu=True)
+    freq = psutil.cpu_freq()
+    return {
+        'avg': sum(percpu) / len(percpu) if percpu else 0.0,
+        'percpu': percpu,
+        'frequency': {
+            'current': freq.current if freq else None,
+            'min': freq.min if freq else None,
+            'max': freq.max if freq else None
+        },
+        'cores': psutil.cpu_count(logical=False),
+        'logical_cores': psutil.cpu_count(logical=True)
+    }
+
+
+def collect_memory():
+    mem = psutil.virtual_memory()
+    return {
+        'total': mem.total,
+        'available': mem.available,
+        'used': mem.used,
+        'percent': mem.percent
+    }
+
+
+def collect_swap():
+    swap = psutil.swap_memory()
+    return {
+        'total': swap.total,
+        'used': swap.used,
+        'free': swap.free,
+        'percent': swap.percent
+    }
+
+
+# mountpoint -> daemon thread still inside disk_usage, and the last usage read per mount
+_disk_pending = {}
+_disk_last = {}
+# disk_usage calls in flight at once; a hung call keeps its slot until it returns
+DISK_USAGE_THREADS = 8
+_disk_slots = threading.BoundedSemaphore(DISK_USAGE_THREADS)
+
+
+def _disk_usage(mountpoint, out):
+    try:
+        out[mountpoint] = psutil.disk_usage(mountpoint)
+    except Exception:
+        pass
+    finally:
+        _disk_slots.release()
+
+
+def collect_disk(mount_timeout=2.0):
+    """Usage per mounted filesystem.
+
+    Every mount is queried on its own daemon thread (at most
+    DISK_USAGE_THREADS at once) and given mount_timeout seconds, so one dead
+    NFS mount only drops that mount: it reports its last usage (if any) and
+    is not queried again until the stuck call returns. When every slot is
+    held by a stuck call, the remaining mounts keep their last usage too.
+    """
+    partitions = [p for p in psutil.disk_partitions() if p.fstype != 'squashfs']
+    usage = {}
+    started = []
+    for partition in partitions:
+        mount = partition.mountpoint
+        pending = _disk_pending.get(mount)
+        if pending is not None and pending.is_alive():
+            continue
+        if not _disk_slots.acquire(timeout=mount_timeout):
+            break
+        thread = threading.Thread(target=_disk_usage, args=(mount, usage), name='disk-usage', daemon=True)
+        thread.start()
+        _disk_pending[mount] = thread
+        started.append((mount, thread, time.monotonic()))
+    for mount, thread, at in started:
+        thread.join(max(0, at + mount_timeout - time.monotonic()))
+        if not thread.is_alive():
+            del _disk_pending[mount]
+            if mount in usage:
+                _disk_last[mount] = usage[mount]
+            else:
+                _disk_last.pop(mount, None)
+
+    disk_info = {}
+    for partition in partitions:
+        u = _disk_last.get(partition.mountpoint)
+        if u is None:
+            continue
+        disk_info[partition.mountpoint] = {
+            'device': partition.device,
+            'total': u.total,
+            'used': u.used,
+            'free': u.free,
+            'percent': u.percent,
+            'fstype': partition.fstype
+        }
+    return disk_info
+
+
+def collect_disk_io():
+    """Cumulative I/O counters per block device."""
+    counters = psutil.disk_io_counters(perdisk=True) or {}
+    return {
+        dev: {
+            'read_count': c.read_count,
+            'write_count': c.write_count,
+            'read_bytes': c.read_bytes,
+            'write_bytes': c.write_bytes,
+            'read_time': c.read_time,
+            'write_time': c.write_time,
+            'busy_time': getattr(c, 'busy_time', None)
+        }
+        for dev, c in counters.items()
+    }
+
+
+def collect_net():
+    net = psutil.net_io_counters()
+    return {
+        'bytes_sent': net.bytes_sent,
+        'bytes_recv': net.bytes_recv,
+        'packets_sent': net.packets_sent,
+        'packets_recv': net.packets_recv
+    }
+
+
+def collect_nics():
+    """Cumulative counters per network interface."""
+    return {
+        nic: {
+            'bytes_sent': c.bytes_sent,
+            'bytes_recv': c.bytes_recv,
+            'packets_sent': c.packets_sent,
+            'packets_recv': c.packets_recv,
+            'errin': c.errin,
+            'errout': c.errout,
+            'dropin': c.dropin,
+            'dropout': c.dropout
+        }
+        for nic, c in psutil.net_io_counters(pernic=True).items()
+    }
+
+
+def collect_connections():
+    return len(psutil.net_connections())
+
+
+def collect_load():
+    return list(os.getloadavg())
+
+
+def collect_sensors():
+    """Temperatures per chip: [{label, current, high, critical}]."""
+    return {
+        chip: [
+            {'label': s.label, 'current': s.current, 'high': s.high, 'critical': s.critical}
+            for s in entries
+        ]
+        for chip, entries in psutil.sensors_temperatures().items()
+    }
+
+
+# name: (function, interval in seconds or None for every snapshot, timeout in seconds)
+DEFAULT_COLLECTORS = {
+    'cpu': (collect_cpu, None, 2.0),
+    'memory': (collect_memory, None, 2.0),
+    'swap': (collect_swap, None, 2.0),
+    'net': (collect_net, None, 2.0),
+    'nics': (collect_nics, None, 2.0),
+    'disk_io': (collect_disk_io, None, 2.0),
+    'disk': (collect_disk, 120, 10.0),
+    'connections': (collect_connections, 60, 10.0),
+    'load': (collect_load, None, 2.0),
+    'sensors': (collect_sensors, 120, 10.0),
+}
+
+
+def default_registry(options=None, max_threads=16):
+    """Registry of the local psutil collectors.
+
+    options: {name: {'interval': ..., 'timeout': ...}} overrides, or
+    {name: None} to disable a collector.
+    """
+    options = options or {}
+    registry = CollectorRegistry(max_threads=max_threads)
+    for name, (func, interval, timeout) in DEFAULT_COLLECTORS.items():
+        if name == 'load' and not hasattr(os, 'getloadavg'):
+            continue
+        if name == 'sensors' and not hasattr(psutil, 'sensors_temperatures'):
+            continue
+        if name in options and options[name] is None:
+            continue
+        opts = options.get(name) or {}
+        registry.register(name, func, opts.get('interval', interval), opts.get('timeout', timeout))
+    return registry
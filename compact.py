@@ -0,0 +1,91 @@
+import gzip
+import json
+import struct
+import sys
+import time
+from array import array
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Binary /history layout (all little-endian):
+#   magic b'SMH1' | uint32 header length | JSON header, space-padded to a multiple of 8
+#   [int32 time offsets, when the header has no fixed step] | float32 column per series
+# Times are the chart's wall clock (the instant the ISO label denotes) in ms:
+#   t[i] = base + step * i   or   base + offsets[i] * unit
+MAGIC = b'SMH1'
+MIMETYPE = 'application/vnd.sysmon.series'
+MIN_COMPRESS_SIZE = 1024
+
+
+def _wall_ms(t):
+    """Epoch ms of the ISO labels for sample times t (naive utcnow() timestamps)."""
+    first = time.localtime(t[0]).tm_gmtoff
+    if first == time.localtime(t[-1]).tm_gmtoff:
+        return [(x + first) * 1000.0 for x in t]
+    # the server's UTC offset changed inside the range (DST)
+    return [(x + time.localtime(x).tm_gmtoff) * 1000.0 for x in t]
+
+
+def _float32(values):
+    column = array('f', (float('nan') if v is None else v for v in values))
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def pack_series(series):
+    """Encode a get_time_series / get_aggregate_series result (with_times=True).
+
+    Every list of per-point numbers becomes a float32 column (None -> NaN);
+    other keys (resolution, cursor, agg) go into the header. Labels are not
+    sent: the client derives them from the timestamps.
+    """
+    t = series['t']
+    n = len(t)
+    names = [k for k, v in series.items() if k not in ('t', 'labels') and isinstance(v, list) and len(v) == n]
+    header = {k: v for k, v in series.items() if k not in names and k not in ('t', 'labels')}
+    header.update({'n': n, 'columns': names, 'base': 0, 'step': None, 'unit': 1})
+
+    offsets = b''
+    if n:
+        wall = _wall_ms(t)
+        base = wall[0]
+        header['base'] = base
+        steps = {round(b - a) for a, b in zip(wall, wall[1:])}
+        step = steps.pop() if len(steps) == 1 else None
+        if n == 1:
+            header['step'] = 0
+        elif step is not None and all(abs(w - base - i * step) < 1 for i, w in enumerate(wall)):
+            header['step'] = step
+        else:
+            # ms resolution for ranges up to ~24 days, whole seconds beyond that
+            unit = 1 if wall[-1] - base < 2 ** 31 else 1000
+            header['unit'] = unit
+            column = array('i', (round((w - base) / unit) for w in wall))
+            if sys.byteorder != 'little':
+                column.byteswap()
+            offsets = column.tobytes()
+
+    head = json.dumps(header).encode()
+    head += b' ' * (-(len(head) + 8) % 8)
+    parts = [MAGIC, struct.pack('<I', len(head)), head, offsets]
+    parts.extend(_float32(series[k]) for k in names)
+    return b''.join(parts)
+
+
+def choose_encoding(accept_encoding):
+    """Best supported Content-Encoding for an Accept-Encoding header, or None."""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
@@ -0,0 +1,177 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from history_store import _TimeIndex, _zeros
+
+MB = 1024 * 1024
+
+# Rates per device, all per second except await_ms (average ms per I/O) and
+# util (percent of the interval the device was busy).
+KINDS = {
+    'disk_io': ('reads', 'writes', 'read_mb', 'write_mb', 'await_ms', 'util'),
+    'net_io': ('rx_mb', 'tx_mb', 'rx_packets', 'tx_packets', 'errors', 'drops'),
+}
+# pseudo devices that would only add noise (and memory); container and VM interfaces
+# come and go with their workloads (override with SystemMonitor(skip_nics=...))
+SKIP_DISKS = ('loop', 'ram', 'zram', 'sr', 'fd')
+SKIP_NICS = ('lo', 'veth', 'cali', 'docker', 'br-', 'virbr', 'vnet', 'cni', 'flannel', 'vxlan',
+             'kube-', 'weave', 'tunl', 'lxc')
+
+
+def _disk_rates(prev, cur, dt):
+    d = {k: cur[k] - prev[k] for k in ('read_count', 'write_count', 'read_bytes', 'write_bytes',
+                                        'read_time', 'write_time')}
+    if min(d.values()) < 0:
+        return None
+    ops = d['read_count'] + d['write_count']
+    util = None
+    if cur.get('busy_time') is not None and prev.get('busy_time') is not None:
+        busy = cur['busy_time'] - prev['busy_time']
+        if busy < 0:
+            return None
+        util = min(100.0, busy / (dt * 1000) * 100)
+    return {
+        'reads': d['read_count'] / dt,
+        'writes': d['write_count'] / dt,
+        'read_mb': d['read_bytes'] / dt / MB,
+        'write_mb': d['write_bytes'] / dt / MB,
+        'await_ms': (d['read_time'] + d['write_time']) / ops if ops else 0.0,
+        'util': util,
+    }
+
+
+def _nic_rates(prev, cur, dt):
+    d = {k: cur[k] - prev[k] for k in cur if k in prev}
+    if len(d) < 8 or min(d.values()) < 0:
+        return None
+    return {
+        'rx_mb': d['bytes_recv'] / dt / MB,
+        'tx_mb': d['bytes_sent'] / dt / MB,
+        'rx_packets': d['packets_recv'] / dt,
+        'tx_packets': d['packets_sent'] / dt,
+        'errors': (d['errin'] + d['errout']) / dt,
+        'drops': (d['dropin'] + d['dropout']) / dt,
+    }
+
+
+def device_rates(prev, snapshot, skip_nics=SKIP_NICS):
+    """{'disk_io': {device: rates}, 'net_io': {nic: rates}} between two snapshots.
+
+    Uses the cumulative counters of the disk_io and nics collectors; devices
+    that are new, skipped (SKIP_DISKS, skip_nics name prefixes) or whose
+    counters went backwards are left out.
+    Returns None when there is nothing to compare.
+    """
+    if prev is None:
+        return None
+    dt = snapshot['t'] - prev['t']
+    if dt <= 0:
+        return None
+    out = {}
+    for kind, key, skip, rates in (('disk_io', 'disk_io', SKIP_DISKS, _disk_rates),
+                                   ('net_io', 'nics', tuple(skip_nics), _nic_rates)):
+        before = prev.get(key) or {}
+        devices = {}
+        for name, counters in (snapshot.get(key) or {}).items():
+            if name.startswith(skip) or name not in before:
+                continue
+            r = rates(before[name], counters, dt)
+            if r is not None:
+                devices[name] = r
+        if devices:
+            out[kind] = devices
+    return out or None
+
+
+class DeviceTier:
+    """Ring buffer of per-device rates: one shared time column and float32
+    columns per (kind, device, metric), allocated when a device first appears.
+    Samples where a device is missing hold NaN. The columns of a device are
+    freed once it is gone and its last sample has been overwritten.
+    """
+
+    def __init__(self, maxlen):
+        self.maxlen = max(1, int(maxlen))
+        self._lock = threading.Lock()
+        self._start = 0
+        self._count = 0
+        self._index = _TimeIndex(self)
+        self._t = _zeros('d', self.maxlen)
+        # (kind, device) -> {metric: array('f')}
+        self._cols = {}
+        # (kind, device) -> number of slots holding its rates; its columns are freed at 0
+        self._present = {}
+
+    def __len__(self):
+        return self._count
+
+    def _phys(self, index):
+        return (self._start + index) % self.maxlen
+
+    def first_time(self):
+        with self._lock:
+            return self._t[self._start] if self._count else None
+
+    def push(self, t, rates):
+        """Append the device_rates() of one sample."""
+        with self._lock:
+            if self._count < self.maxlen:
+                p = self._phys(self._count)
+                self._count += 1
+            else:
+                p = self._start
+                self._start = (self._start + 1) % self.maxlen
+            self._t[p] = float(t)
+            for kind, devices in rates.items():
+                for name in devices:
+                    if (kind, name) not in self._cols:
+                        self._cols[(kind, name)] = {
+                            m: array('f', [math.nan]) * self.maxlen for m in KINDS[kind]
+                        }
+                        self._present[(kind, name)] = 0
+            for key, cols in list(self._cols.items()):
+                kind, name = key
+                r = rates.get(kind, {}).get(name)
+                # the first metric is always set for a present device (see select)
+                self._present[key] += (r is not None) - (not math.isnan(cols[KINDS[kind][0]][p]))
+                if not self._present[key]:
+                    # gone and its last sample overwritten: nothing left to read
+                    del self._cols[key], self._present[key]
+                    continue
+                r = r or {}
+                for m, col in cols.items():
+                    v = r.get(m)
+                    col[p] = math.nan if v is None else v
+
+    def devices(self):
+        """{kind: [device, ...]} of every device seen."""
+        with self._lock:
+            keys = list(self._cols)
+        out = {kind: [] for kind in KINDS}
+        for kind, name in keys:
+            out[kind].append(name)
+        return out
+
+    def select(self, kind, device, start, end):
+        """{'t': [...], <metric>: [...]} for start <= t <= end, samples without the device skipped."""
+        metrics = KINDS[kind]
+        out = {'t': []}
+        out.update({m: [] for m in metrics})
+        with self._lock:
+            cols = self._cols.get((kind, device))
+            if cols is None:
+                return out
+            lo = bisect_left(self._index, start)
+            hi = bisect_right(self._index, end, lo)
+            first = cols[metrics[0]]
+            for i in range(lo, hi):
+                p = self._phys(i)
+                if math.isnan(first[p]):
+                    continue
+                out['t'].append(self._t[p])
+                for m in metrics:
+                    v = cols[m][p]
+                    out[m].append(None if math.isnan(v) else v)
+        return out
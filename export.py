@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet / arrow exports report it as unavailable
+    pa = pq = None
+
+# exportable metrics; net rates are MB/s between consecutive samples, disk is the
+# used percent over all mounts (as in aggregate.metric_arrays)
+METRICS = ('cpu', 'memory', 'net_rx', 'net_tx', 'disk', 'cpu_freq', 'mem_used', 'mem_available',
+           'bytes_sent', 'bytes_recv')
+DEFAULT_METRICS = ('cpu', 'memory', 'net_rx', 'net_tx', 'disk')
+INTEGER_METRICS = ('mem_used', 'mem_available', 'bytes_sent', 'bytes_recv')
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+# rows per Parquet row group: bounds the rows held before they are written out
+ROW_GROUP = 65536
+
+# positions in storage.SAMPLE_COLUMNS (+ disk used / total from SampleDB.iter_samples)
+_T, _CPU, _FREQ, _MEM_AVAILABLE, _MEM_USED, _MEM, _SENT, _RECV, _DISK_USED, _DISK_SIZE = (
+    0, 1, 2, 8, 9, 10, 11, 12, 13, 14)
+MB = 1024 * 1024
+
+
+def available(fmt):
+    """True when the format can be written (parquet / arrow need pyarrow)."""
+    return fmt in ('csv', 'ndjson') or pa is not None
+
+
+def rows(chunks, metrics):
+    """Turn SampleDB.iter_samples chunks into chunks of (t, <metric>...) tuples.
+
+    Net rates are None for the first sample and across counter resets.
+    """
+    prev = None
+    for chunk in chunks:
+        out = []
+        for r in chunk:
+            t = r[_T]
+            rx = tx = None
+            if prev is not None and t > prev[_T]:
+                dt = t - prev[_T]
+                if r[_RECV] >= prev[_RECV] and r[_SENT] >= prev[_SENT]:
+                    rx = (r[_RECV] - prev[_RECV]) / dt / MB
+                    tx = (r[_SENT] - prev[_SENT]) / dt / MB
+            prev = r
+            values = {
+                'cpu': r[_CPU],
+                'memory': r[_MEM],
+                'net_rx': rx,
+                'net_tx': tx,
+                'cpu_freq': r[_FREQ],
+                'mem_used': r[_MEM_USED],
+                'mem_available': r[_MEM_AVAILABLE],
+                'bytes_sent': r[_SENT],
+                'bytes_recv': r[_RECV],
+            }
+            if 'disk' in metrics:
+                size = r[_DISK_SIZE]
+                values['disk'] = r[_DISK_USED] / size * 100 if size else None
+            out.append((t,) + tuple(values[m] for m in metrics))
+        yield out
+
+
+def _iso(t):
+    # t is a naive-UTC epoch like everywhere else, so fromtimestamp() gives the UTC wall clock
+    return datetime.fromtimestamp(t).isoformat() + 'Z'
+
+
+def encode(fmt, metrics, tagged_chunks):
+    """Yield the bytes of an export in `fmt` from (host, rows() chunk) pairs.
+
+    Columns are host, ts (ISO 8601 UTC), t (epoch seconds) and the metrics.
+    Nothing but the current chunk (or Parquet row group) is held in memory.
+    """
+    columns = ('host', 'ts', 't') + tuple(metrics)
+    if fmt == 'csv':
+        yield _csv_lines([columns])
+        for host, chunk in tagged_chunks:
+            yield _csv_lines((host, _iso(r[0])) + r for r in chunk)
+    elif fmt == 'ndjson':
+        for host, chunk in tagged_chunks:
+            yield ''.join(json.dumps(dict(zip(columns, (host, _iso(r[0])) + r))) + '\n' for r in chunk).encode()
+    else:
+        yield from _encode_arrow(fmt, metrics, tagged_chunks)
+
+
+def _csv_lines(records):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(records)
+    return buf.getvalue().encode()
+
+
+class _Sink:
+    """Write-only file object collecting what pyarrow writes until drained."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _encode_arrow(fmt, metrics, tagged_chunks):
+    fields = [('host', pa.string()), ('ts', pa.timestamp('us', tz='UTC')), ('t', pa.float64())]
+    fields += [(m, pa.int64() if m in INTEGER_METRICS else pa.float64()) for m in metrics]
+    schema = pa.schema(fields)
+    sink = _Sink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    def table(hosts, records):
+        cols = list(zip(*records))
+        arrays = [pa.array(hosts, pa.string()),
+                  pa.array([datetime.fromtimestamp(t) for t in cols[0]], pa.timestamp('us', tz='UTC')),
+                  pa.array(cols[0], pa.float64())]
+        arrays += [pa.array(c, kind) for c, kind in zip(cols[1:], schema.types[3:])]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    hosts, records = [], []
+    for host, chunk in tagged_chunks:
+        hosts.extend([host] * len(chunk))
+        records.extend(chunk)
+        # Arrow streams a batch per chunk; Parquet waits for a full row group
+        if records and (fmt == 'arrow' or len(records) >= ROW_GROUP):
+            writer.write_table(table(hosts, records))
+            hosts, records = [], []
+            yield sink.drain()
+    if records:
+        writer.write_table(table(hosts, records))
+    writer.close()
+    yield sink.drain()
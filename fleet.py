@@ -0,0 +1,361 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import paramiko
+
+from monitor import MetricStore
+
+# One round trip per host per sweep: every source the snapshot needs, separated by markers
+COLLECT_COMMAND = (
+    "cat /proc/stat; echo @@; cat /proc/meminfo; echo @@; "
+    "df -P -B1 -T 2>/dev/null; echo @@; cat /proc/net/dev"
+)
+# df filesystem types that are not real storage (psutil.disk_partitions() skips these too)
+PSEUDO_FS = {
+    'tmpfs', 'devtmpfs', 'squashfs', 'overlay', 'proc', 'sysfs', 'cgroup', 'cgroup2',
+    'devpts', 'mqueue', 'debugfs', 'tracefs', 'securityfs', 'pstore', 'efivarfs', 'autofs'
+}
+
+
+def load_hosts(path):
+    """Read the host registry: a JSON list of
+    {"name", "hostname", "port", "username", "password" | "key_filename"}.
+    name defaults to hostname and port to 22.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    hosts = []
+    for entry in entries:
+        if not entry.get('hostname'):
+            raise ValueError(f'host entry without hostname: {entry!r}')
+        host = dict(entry)
+        host.setdefault('name', host['hostname'])
+        host.setdefault('port', 22)
+        hosts.append(host)
+    return hosts
+
+
+class SSHPool:
+    """Persistent SSH connections, one per host, with keepalive and reconnect.
+
+    A broken or closed transport is replaced on the next command. After a
+    failed connect the host is skipped for an exponentially growing backoff
+    (capped at max_backoff) so one dead box does not eat a worker every sweep.
+    """
+
+    def __init__(self, keepalive=30, connect_timeout=10, max_backoff=300):
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.max_backoff = max_backoff
+        self._clients = {}
+        self._locks = {}
+        self._backoff = {}
+        self._lock = threading.Lock()
+
+    def _host_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _connect(self, host):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            host['hostname'],
+            port=host.get('port', 22),
+            username=host.get('username'),
+            password=host.get('password'),
+            key_filename=host.get('key_filename'),
+            timeout=self.connect_timeout,
+            banner_timeout=self.connect_timeout,
+            auth_timeout=self.connect_timeout,
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def _client(self, host):
+        """Return a live client for host, reconnecting if needed. Caller holds the host lock."""
+        name = host['name']
+        client = self._clients.get(name)
+        transport = client.get_transport() if client else None
+        if transport is not None and transport.is_active():
+            return client
+        if client is not None:
+            client.close()
+            self._clients.pop(name, None)
+
+        retry_at, delay = self._backoff.get(name, (0, 0))
+        if time.monotonic() < retry_at:
+            raise ConnectionError(f'{name}: waiting to reconnect')
+        try:
+            client = self._connect(host)
+        except Exception:
+            delay = min(self.max_backoff, delay * 2 if delay else 5)
+            self._backoff[name] = (time.monotonic() + delay, delay)
+            raise
+        self._backoff.pop(name, None)
+        self._clients[name] = client
+        return client
+
+    def run(self, host, command, timeout=20):
+        """Run command on host and return its stdout; retries once on a dropped connection."""
+        with self._host_lock(host['name']):
+            for attempt in range(2):
+                client = self._client(host)
+                try:
+                    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                    return stdout.read().decode()
+                except (paramiko.SSHException, EOFError, OSError):
+                    client.close()
+                    self._clients.pop(host['name'], None)
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+def _parse_cpu(text):
+    """Return {'cpu': (busy, total), 'cpu0': ...} jiffies from /proc/stat."""
+    counters = {}
+    for line in text.splitlines():
+        if not line.startswith('cpu'):
+            continue
+        fields = line.split()
+        values = [int(v) for v in fields[1:9]]
+        # idle + iowait count as idle, like psutil.cpu_percent
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values)
+        counters[fields[0]] = (total - idle, total)
+    return counters
+
+
+def _percent(cur, prev):
+    if not prev:
+        return 0.0
+    busy = cur[0] - prev[0]
+    total = cur[1] - prev[1]
+    return round(100.0 * busy / total, 1) if total > 0 else 0.0
+
+
+def _parse_meminfo(text):
+    info = {}
+    for line in text.splitlines():
+        key, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            info[key] = int(parts[0]) * 1024
+    return info
+
+
+def _parse_df(text):
+    disk_info = {}
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 7 or fields[1] in PSEUDO_FS:
+            continue
+        device, fstype, total, used, free = fields[0], fields[1], int(fields[2]), int(fields[3]), int(fields[4])
+        mount = ' '.join(fields[6:])
+        disk_info[mount] = {
+            'device': device,
+            'total': total,
+            'used': used,
+            'free': free,
+            'percent': round(used / (used + free) * 100, 1) if used + free else 0.0,
+            'fstype': fstype
+        }
+    return disk_info
+
+
+def _parse_net(text):
+    rx = tx = rx_packets = tx_packets = 0
+    for line in text.splitlines()[2:]:
+        _, _, data = line.partition(':')
+        fields = data.split()
+        if len(fields) < 10:
+            continue
+        rx += int(fields[0])
+        rx_packets += int(fields[1])
+        tx += int(fields[8])
+        tx_packets += int(fields[9])
+    return {'bytes_recv': rx, 'bytes_sent': tx, 'packets_recv': rx_packets, 'packets_sent': tx_packets}
+
+
+def _stats(snapshot, swap=None, net=None):
+    """The /stats payload of a fleet snapshot.
+
+    swap and the packet counters are not stored in SQLite, so replicas
+    building it from a stored snapshot report them as None.
+    """
+    net = net or snapshot['net']
+    return {
+        'ts': snapshot['ts'],
+        'cpu': snapshot['cpu'],
+        'memory': dict(snapshot['memory'], swap=swap),
+        'disk': snapshot['disk'],
+        'network': {
+            'bytes_sent': round(net['bytes_sent'] / (1024*1024), 4),
+            'bytes_recv': round(net['bytes_recv'] / (1024*1024), 4),
+            'packets_sent': net.get('packets_sent'),
+            'packets_recv': net.get('packets_recv'),
+            'active_connections': None
+        }
+    }
+
+
+class FleetCollector:
+    """Collect snapshots from many hosts over SSH into one MetricStore per host.
+
+    Every sweep runs all hosts concurrently on a thread pool (one I/O-bound
+    worker per host up to max_workers), so a sweep takes about as long as the
+    slowest host. Each host gets its own SQLite file
+    under storage_dir.
+
+    role mirrors SystemMonitor: 'standalone' collects and serves in one
+    process; 'sampler' collects and writes every sweep to SQLite straight
+    away; 'replica' (web workers) never connects to the hosts and only
+    follows the files the sampler writes, so N workers do not mean N sweeps
+    and N writers per host.
+    """
+
+    def __init__(self, hosts, interval=60, max_days=7, storage_dir='fleet', persist=True,
+                 max_workers=256, command_timeout=20, role='standalone'):
+        if role not in ('standalone', 'sampler', 'replica'):
+            raise ValueError(f'unknown role: {role}')
+        self.hosts = {h['name']: h for h in hosts}
+        self.interval = interval
+        self.command_timeout = command_timeout
+        self.role = role
+        self.pool = SSHPool() if role != 'replica' else None
+        self._executor = None
+        if role != 'replica':
+            self._executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.hosts))))
+        self._prev_cpu = {}
+        self.errors = {}
+        self.stores = {}
+        for name in self.hosts:
+            safe = re.sub(r'[^A-Za-z0-9._-]', '_', name)
+            self.stores[name] = MetricStore(
+                sample_interval=interval, max_days=max_days,
+                storage_path=os.path.join(storage_dir, f'{safe}.db'), persist=persist,
+                # the sampler writes every sweep (one transaction per host) so replicas see it
+                flush_batch=1 if role == 'sampler' else 100,
+                read_only=(role == 'replica')
+            )
+        target = self._follow_loop if role == 'replica' else self._loop
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def store(self, name):
+        """MetricStore for a host name, or None if it is not in the registry."""
+        return self.stores.get(name)
+
+    def _loop(self):
+        last_cleanup = time.monotonic()
+        while True:
+            started = time.monotonic()
+            self.sweep()
+            if time.monotonic() - last_cleanup >= 3600:
+                for store in self.stores.values():
+                    store._cleanup_old_snapshots()
+                last_cleanup = time.monotonic()
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def _follow_loop(self):
+        """Replica role: pick up what the sampler process wrote to each host's file."""
+        while True:
+            started = time.monotonic()
+            for name, store in self.stores.items():
+                try:
+                    store.catch_up(_stats)
+                    self.errors.pop(name, None)
+                except Exception as e:
+                    self.errors[name] = str(e)
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def sweep(self):
+        """Collect every host once, concurrently; returns when all hosts are done."""
+        list(self._executor.map(self._collect, self.hosts.values()))
+
+    def _collect(self, host):
+        name = host['name']
+        try:
+            out = self.pool.run(host, COLLECT_COMMAND, timeout=self.command_timeout)
+            snapshot, stats = self._parse(name, out)
+        except Exception as e:
+            self.errors[name] = str(e)
+            return
+        self.errors.pop(name, None)
+        if snapshot is not None:
+            self.stores[name].ingest(snapshot, stats)
+
+    def _parse(self, name, out):
+        """Turn the COLLECT_COMMAND output into (snapshot, stats) like SystemMonitor produces.
+
+        CPU utilization needs two /proc/stat readings, so a host's first sweep
+        only records the reading and returns (None, None).
+        """
+        sections = out.split('@@\n')
+        if len(sections) < 4:
+            raise ValueError('unexpected collector output')
+        now = datetime.utcnow()
+
+        cpu = _parse_cpu(sections[0])
+        prev = self._prev_cpu.get(name)
+        self._prev_cpu[name] = cpu
+        if not prev:
+            return None, None
+        cores = sorted((k for k in cpu if k != 'cpu'), key=lambda k: int(k[3:]))
+        percpu = [_percent(cpu[k], prev.get(k)) for k in cores]
+
+        mem = _parse_meminfo(sections[1])
+        total = mem.get('MemTotal', 0)
+        available = mem.get('MemAvailable', mem.get('MemFree', 0))
+        swap_total = mem.get('SwapTotal', 0)
+        swap_used = swap_total - mem.get('SwapFree', 0)
+
+        net = _parse_net(sections[3])
+        swap = {
+            'total': swap_total,
+            'used': swap_used,
+            'free': swap_total - swap_used,
+            'percent': round(swap_used / swap_total * 100, 1) if swap_total else 0.0
+        }
+        snapshot = {
+            'ts': now.isoformat() + 'Z',
+            't': now.timestamp(),
+            'cpu': {
+                'avg': _percent(cpu['cpu'], prev.get('cpu')) if 'cpu' in cpu else 0.0,
+                'percpu': percpu,
+                'frequency': {'current': None, 'min': None, 'max': None},
+                'cores': None,
+                'logical_cores': len(cores)
+            },
+            'memory': {
+                'total': total,
+                'available': available,
+                'used': total - available,
+                'percent': round((total - available) / total * 100, 1) if total else 0.0
+            },
+            'disk': _parse_df(sections[2]),
+            'net': {'bytes_sent': net['bytes_sent'], 'bytes_recv': net['bytes_recv']}
+        }
+        return snapshot, _stats(snapshot, swap, net)
+
+    def status(self):
+        """Per-host summary for the registry: last sample time and last error."""
+        return {
+            name: {
+                'hostname': host['hostname'],
+                'last_sample': self.stores[name].latest_sample_time(),
+                'error': self.errors.get(name)
+            }
+            for name, host in self.hosts.items()
+        }
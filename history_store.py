@@ -0,0 +1,331 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+def _zeros(typecode, n):
+    """Return a preallocated array of n zero items."""
+    return array(typecode, bytes(array(typecode).itemsize * n))
+
+
+def quantize_percent(values):
+    """Pack percentages into one byte each: rounded to whole percent, clamped to 0..100."""
+    return bytes(min(100, max(0, int(round(v or 0)))) for v in values)
+
+
+class _TimeIndex:
+    """Read-only sequence view of the timestamp column in logical (oldest-first) order.
+
+    Lets `bisect` search the ring buffer without copying it.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return self._store._count
+
+    def __getitem__(self, index):
+        return self._store._t[self._store._phys(index)]
+
+
+class HistoryStore:
+    """Fixed-capacity columnar ring buffer of snapshots.
+
+    Each metric lives in its own preallocated `array` column instead of one dict
+    per sample, so memory per sample is a small fixed number of bytes
+    (roughly 60 + cores + 24 * mounts): per-CPU utilization is kept as a
+    matrix of whole percents, one byte per core. The columns of a mount are
+    freed once it is gone and its last sample has been overwritten.
+    Snapshots are rebuilt as dicts only when read, using the same layout
+    `SystemMonitor._take_snapshot` produces.
+
+    The store behaves like the bounded deque it replaces: `append`,
+    `extendleft`, `len`, truthiness, indexing (including negative indexes)
+    and iteration.
+    Samples are expected in time order; range lookups binary search the
+    timestamp column, so a clock stepping backwards only skews results
+    around that point.
+    """
+
+    def __init__(self, maxlen):
+        self.maxlen = max(1, int(maxlen))
+        self._lock = threading.Lock()
+        self._start = 0
+        self._count = 0
+        self._index = _TimeIndex(self)
+
+        n = self.maxlen
+        self._t = _zeros('d', n)
+        self._cpu_avg = _zeros('d', n)
+        self._cpu_freq = _zeros('f', n)
+        self._mem_total = _zeros('Q', n)
+        self._mem_available = _zeros('Q', n)
+        self._mem_used = _zeros('Q', n)
+        self._mem_percent = _zeros('f', n)
+        self._bytes_sent = _zeros('Q', n)
+        self._bytes_recv = _zeros('Q', n)
+
+        # per-CPU uint8 matrix (sample-major), allocated on first append once the core count is known
+        self._ncpu = 0
+        self._percpu = None
+
+        # mountpoint -> (total, used, free) columns; total == 0 marks "not mounted"
+        self._disk = {}
+        self._mount_meta = {}
+        # mountpoint -> number of slots where it is mounted; its columns are freed at 0
+        self._disk_present = {}
+
+        # values that do not change between samples
+        self._cpu_static = {'freq_min': None, 'freq_max': None, 'cores': None, 'logical_cores': None}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        with self._lock:
+            if index < 0:
+                index += self._count
+            if index < 0 or index >= self._count:
+                raise IndexError('history index out of range')
+            return self._build(self._phys(index))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            try:
+                yield self[i]
+            except IndexError:
+                return
+
+    def _phys(self, index):
+        return (self._start + index) % self.maxlen
+
+    def append(self, snapshot):
+        """Store one snapshot dict, overwriting the oldest sample once full."""
+        with self._lock:
+            if self._count < self.maxlen:
+                p = self._phys(self._count)
+                self._count += 1
+            else:
+                p = self._start
+                self._start = (self._start + 1) % self.maxlen
+            self._write(p, snapshot)
+
+    def extendleft(self, snapshots):
+        """Insert older snapshots (oldest first) in front of the current ones.
+
+        Used to hydrate history from the DB newest-to-oldest while the sampler
+        keeps appending. Only free capacity is used: once full, the remaining
+        (oldest) snapshots are dropped. Returns the number stored.
+        """
+        stored = 0
+        with self._lock:
+            for snapshot in reversed(snapshots):
+                if self._count >= self.maxlen:
+                    break
+                self._start = (self._start - 1) % self.maxlen
+                self._count += 1
+                self._write(self._start, snapshot, newest=False)
+                stored += 1
+        return stored
+
+    def _write(self, p, snapshot, newest=True):
+        """Copy a snapshot into physical slot p. Caller holds the lock.
+
+        Static CPU values and mount metadata follow the newest sample, so
+        older snapshots written with newest=False only fill in what is unknown.
+        """
+        cpu = snapshot.get('cpu') or {}
+        mem = snapshot.get('memory') or {}
+        net = snapshot.get('net') or {}
+        freq = cpu.get('frequency') or {}
+        percpu = cpu.get('percpu') or []
+
+        self._t[p] = float(snapshot['t'])
+        self._cpu_avg[p] = float(cpu.get('avg') or 0.0)
+        self._cpu_freq[p] = float(freq.get('current') or 0.0)
+        self._mem_total[p] = int(mem.get('total') or 0)
+        self._mem_available[p] = int(mem.get('available') or 0)
+        self._mem_used[p] = int(mem.get('used') or 0)
+        self._mem_percent[p] = float(mem.get('percent') or 0.0)
+        self._bytes_sent[p] = int(net.get('bytes_sent') or 0)
+        self._bytes_recv[p] = int(net.get('bytes_recv') or 0)
+
+        if self._percpu is None and percpu:
+            self._ncpu = len(percpu)
+            self._percpu = _zeros('B', self.maxlen * self._ncpu)
+        if self._percpu is not None:
+            row = quantize_percent(percpu[:self._ncpu])
+            base = p * self._ncpu
+            self._percpu[base:base + self._ncpu] = array('B', row.ljust(self._ncpu, b'\0'))
+
+        if newest or self._cpu_static['logical_cores'] is None:
+            self._cpu_static = {
+                'freq_min': freq.get('min'),
+                'freq_max': freq.get('max'),
+                'cores': cpu.get('cores'),
+                'logical_cores': cpu.get('logical_cores'),
+            }
+
+        disk = snapshot.get('disk') or {}
+        for mount, info in disk.items():
+            cols = self._disk.get(mount)
+            if cols is None:
+                cols = (_zeros('Q', self.maxlen), _zeros('Q', self.maxlen), _zeros('Q', self.maxlen))
+                self._disk[mount] = cols
+                self._disk_present[mount] = 0
+            total = int(info.get('total') or 0)
+            self._disk_present[mount] += bool(total) - bool(cols[0][p])
+            cols[0][p] = total
+            cols[1][p] = int(info.get('used') or 0)
+            cols[2][p] = int(info.get('free') or 0)
+            if newest or mount not in self._mount_meta:
+                self._mount_meta[mount] = {'device': info.get('device'), 'fstype': info.get('fstype')}
+        for mount, cols in list(self._disk.items()):
+            if mount in disk:
+                continue
+            if cols[0][p]:
+                cols[0][p] = 0
+                self._disk_present[mount] -= 1
+            if not self._disk_present[mount]:
+                # unmounted and its last sample overwritten: nothing left to read
+                del self._disk[mount], self._disk_present[mount]
+                self._mount_meta.pop(mount, None)
+
+    def _build(self, p):
+        """Rebuild the snapshot dict stored at physical slot p."""
+        t = self._t[p]
+        if self._percpu is not None:
+            base = p * self._ncpu
+            percpu = [float(v) for v in self._percpu[base:base + self._ncpu]]
+        else:
+            percpu = []
+        freq = self._cpu_freq[p]
+
+        disk_info = {}
+        for mount, (total, used, free) in self._disk.items():
+            if not total[p]:
+                continue
+            meta = self._mount_meta.get(mount, {})
+            u, f = used[p], free[p]
+            disk_info[mount] = {
+                'device': meta.get('device'),
+                'total': total[p],
+                'used': u,
+                'free': f,
+                'percent': round(u / (u + f) * 100, 1) if u + f else 0.0,
+                'fstype': meta.get('fstype')
+            }
+
+        return {
+            # t was produced from a naive utcnow(), so fromtimestamp() gives the UTC wall clock back
+            'ts': datetime.fromtimestamp(t).isoformat() + 'Z',
+            't': t,
+            'cpu': {
+                'avg': self._cpu_avg[p],
+                'percpu': percpu,
+                'frequency': {
+                    'current': round(freq, 2) if freq else None,
+                    'min': self._cpu_static['freq_min'],
+                    'max': self._cpu_static['freq_max']
+                },
+                'cores': self._cpu_static['cores'],
+                'logical_cores': self._cpu_static['logical_cores']
+            },
+            'memory': {
+                'total': self._mem_total[p],
+                'available': self._mem_available[p],
+                'used': self._mem_used[p],
+                'percent': round(self._mem_percent[p], 1)
+            },
+            'disk': disk_info,
+            'net': {
+                'bytes_sent': self._bytes_sent[p],
+                'bytes_recv': self._bytes_recv[p]
+            }
+        }
+
+    def first_time(self):
+        """Timestamp of the oldest sample, or None when empty."""
+        with self._lock:
+            return self._t[self._start] if self._count else None
+
+    def last_time(self):
+        """Timestamp of the newest sample, or None when empty."""
+        with self._lock:
+            return self._t[self._phys(self._count - 1)] if self._count else None
+
+    def _range(self, start, end):
+        """Logical index bounds [lo, hi) of samples with start <= t <= end.
+
+        Caller must hold the lock.
+        """
+        lo = bisect_left(self._index, start)
+        hi = bisect_right(self._index, end, lo)
+        return lo, hi
+
+    def _slice(self, column, lo, hi, width=1):
+        """Copy logical rows [lo, hi) out of a column, handling wrap-around."""
+        if lo >= hi:
+            return column[0:0]
+        a = self._phys(lo)
+        b = self._phys(hi - 1) + 1
+        if a < b:
+            return column[a * width:b * width]
+        return column[a * width:] + column[:b * width]
+
+    def select(self, start, end):
+        """Return snapshot dicts with start <= t <= end, oldest first.
+
+        Only matching samples are materialized.
+        """
+        with self._lock:
+            lo, hi = self._range(start, end)
+            return [self._build(self._phys(i)) for i in range(lo, hi)]
+
+    def columns(self, start, end, with_previous=False, with_disk=False):
+        """Return the scalar columns for start <= t <= end as array slices.
+
+        Keys: t, cpu_avg, mem_percent, bytes_sent, bytes_recv. Only the
+        matching rows are copied. With with_previous, the sample just before
+        the range (if any) is prepended and 'previous' is set to True, so
+        callers can compute rates for the first sample in the range.
+        With with_disk, 'disk' maps each mountpoint to (total, used, free)
+        slices; total is 0 where the mount was absent.
+        """
+        with self._lock:
+            lo, hi = self._range(start, end)
+            previous = with_previous and 0 < lo < hi
+            if previous:
+                lo -= 1
+            cols = {
+                'previous': previous,
+                't': self._slice(self._t, lo, hi),
+                'cpu_avg': self._slice(self._cpu_avg, lo, hi),
+                'mem_percent': self._slice(self._mem_percent, lo, hi),
+                'bytes_sent': self._slice(self._bytes_sent, lo, hi),
+                'bytes_recv': self._slice(self._bytes_recv, lo, hi),
+            }
+            if with_disk:
+                cols['disk'] = {
+                    mount: tuple(self._slice(c, lo, hi) for c in disk_cols)
+                    for mount, disk_cols in self._disk.items()
+                }
+            return cols
+
+    def percpu(self, start, end):
+        """Return {'t': array('d'), 'cores': n, 'values': array('B')} for start <= t <= end.
+
+        values is the per-core matrix of those samples, sample-major (n bytes
+        per sample, whole percents).
+        """
+        with self._lock:
+            lo, hi = self._range(start, end)
+            if self._percpu is None:
+                return {'t': self._slice(self._t, lo, hi), 'cores': 0, 'values': array('B')}
+            return {
+                't': self._slice(self._t, lo, hi),
+                'cores': self._ncpu,
+                'values': self._slice(self._percpu, lo, hi, width=self._ncpu),
+            }
@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+
+# seconds; covers sub-millisecond lock waits up to multi-second hung collectors
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return 'NaN'
+    if isinstance(v, float) and math.isinf(v):
+        return '+Inf' if v > 0 else '-Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(v)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations (seconds), optionally split by labels."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    v[i] += 1
+                    break
+            else:
+                v[len(self.buckets)] += 1
+            v[-1] += seconds
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        names = self.labelnames + ('le',)
+        for labels, v in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), v):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}')
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_number(v[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class TimedLock:
+    """threading.Lock that records how long `with lock:` waited to acquire it."""
+
+    def __init__(self, histogram):
+        self._lock = threading.Lock()
+        self._histogram = histogram
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._histogram.observe(time.perf_counter() - started)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+
+def family(name, help, samples, labelnames=(), kind='gauge'):
+    """Text lines for a gauge (or counter) read elsewhere: samples is [(label values, value)]
+    or a single value.
+    """
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    if not isinstance(samples, list):
+        samples = [((), samples)]
+    for labels, v in samples:
+        lines.append(f'{name}{_labels(labelnames, labels)} {_number(v)}')
+    return lines
+
+
+# The monitor's own hot paths
+SNAPSHOT_SECONDS = Histogram('sysmon_snapshot_seconds', 'Time to collect and ingest one snapshot.')
+SNAPSHOTS = Counter('sysmon_snapshots_total', 'Snapshots taken, by result.', ('result',))
+COLLECTOR_SECONDS = Histogram('sysmon_collector_seconds', 'Run time of one collector call.', ('collector',))
+DB_FLUSH_SECONDS = Histogram('sysmon_db_flush_seconds', 'Time to write one batch of buffered samples.')
+DB_ROWS = Counter('sysmon_db_samples_written_total', 'Samples written to SQLite.')
+DB_LOCK_WAIT_SECONDS = Histogram('sysmon_db_lock_wait_seconds', 'Time spent waiting for the SQLite lock.')
+SERVICE_STATUS_SECONDS = Histogram('sysmon_service_status_seconds', 'Time to refresh the service status list.')
+HISTORY_SECONDS = Histogram('sysmon_history_seconds', 'Time spent answering /history, by stage.', ('stage',))
+HTTP_SECONDS = Histogram('sysmon_http_request_seconds', 'HTTP request duration, by endpoint.', ('endpoint',))
+
+METRICS = (SNAPSHOT_SECONDS, SNAPSHOTS, COLLECTOR_SECONDS, DB_FLUSH_SECONDS, DB_ROWS, DB_LOCK_WAIT_SECONDS,
+           SERVICE_STATUS_SECONDS, HISTORY_SECONDS, HTTP_SECONDS)
+
+
+def render(extra=()):
+    """Prometheus text exposition of METRICS followed by the `extra` lines."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return '\n'.join(lines) + '\n'
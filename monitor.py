@@ -1,61 +1,764 @@
 import psutil
 import subprocess
 import paramiko
-import threading
-import time
 import collections
-import copy
-import sqlite3
-import json
+import math
 import os
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import aggregate
+import export
+from broadcast import Broadcaster
+from burst import COLUMNS as BURST_COLUMNS, BurstSampler
+from collectors import default_registry
+from devices import KINDS as DEVICE_KINDS, SKIP_NICS, DeviceTier, device_rates
+from history_store import HistoryStore
+from instrument import SERVICE_STATUS_SECONDS, SNAPSHOT_SECONDS, SNAPSHOTS, family
+from processes import ProcessTracker
+from rollups import Rollups, lttb_indices
+from shared_snapshot import DEFAULT_PATH as SHM_PATH, SharedSnapshotReader, SharedSnapshotWriter
+from storage import SampleDB
 
-class SystemMonitor:
-    def __init__(self, sample_interval=60, max_days=7, storage_path='monitor.db', persist=True):
-        """Create monitor, start background sampler.
-        sample_interval: sampling interval in seconds (default 5s)
+# collectors every snapshot needs; the others (disk, disk_io, nics, load, ...) are optional
+REQUIRED_COLLECTORS = ('cpu', 'memory', 'net')
+# smallest rollup bucket, in raw sample intervals, picked automatically for a chart
+ROLLUP_MIN_REDUCTION = 4
+
+DEFAULT_SERVICES = (
+    'nginx', 'apache2', 'mysql', 'postgresql',
+    'mongodb', 'redis-server', 'ssh', 'ufw'
+)
+
+
+class MetricStore:
+    """History, rollups, live stream and persistence for one host's samples.
+
+    SystemMonitor feeds it from the local sampler; the fleet collector keeps
+    one per remote host.
+    """
+
+    # BurstSampler of the local sampler, if any (see SystemMonitor)
+    burst = None
+    # AlertEngine evaluated on every ingested snapshot, if any
+    alerts = None
+    # interface name prefixes left out of the per-device rates
+    skip_nics = SKIP_NICS
+
+    def __init__(self, sample_interval=60, max_days=7, storage_path='monitor.db', persist=True,
+                 flush_interval=None, flush_batch=100, read_only=False):
+        """Create the in-memory history and open (and load) the DB.
+        sample_interval: expected seconds between samples, used to size the history
         max_days: how many days of history to keep (default 7 days)
+        flush_interval / flush_batch: samples are written to SQLite in one transaction
+        every flush_interval seconds or flush_batch samples, whichever comes first.
+        flush_interval defaults to 5 samples (at least 30s), so writes are actually
+        batched; call close() on shutdown to write what is still buffered
+        read_only: load history from the DB but never write to it (another process owns it)
         """
-        self.ssh = None
+        self._init_started = time.monotonic()
         self.sample_interval = sample_interval
         self.persist = persist
+        self.read_only = read_only
         self.storage_path = storage_path
-        self._db_lock = threading.Lock()
-        self._db_conn = None
+        if flush_interval is None:
+            flush_interval = max(30, 5 * sample_interval)
+        # latest /stats payload, with the monotonic time it was recorded
+        self._latest = None
+        # live samples pushed to /stream subscribers
+        self.events = Broadcaster()
+        self._prev_net = None
         # compute maxlen: samples per day = 86400 / sample_interval
         samples_per_day = int(86400 / max(1, self.sample_interval))
-        self.history = collections.deque(maxlen=samples_per_day * max_days)
+        self.history = HistoryStore(maxlen=samples_per_day * max_days)
         self.max_days = max_days
+        # per-disk / per-NIC rates computed at ingest (see devices.device_rates)
+        self.devices = DeviceTier(maxlen=samples_per_day * max_days)
+        self._prev_counters = None
+        self.last_snapshot = None
+        # 1m / 5m / 1h min/avg/max buckets maintained as samples arrive
+        self.rollups = Rollups(max_days)
+
+        # set once history holds everything the DB has (see _load_history_from_db)
+        self.history_warm = threading.Event()
+        # seconds from construction until ready to serve / fully hydrated
+        self.startup = {'ready_seconds': None, 'ready_samples': 0, 'hydrated_seconds': None, 'hydrated_samples': 0}
+        # report of the last retention run (see _cleanup_old_snapshots)
+        self.last_retention = None
 
         # initialize sqlite DB for persistence if requested
+        self.db = None
+        self._hydrate_args = None
         if self.persist:
             try:
-                # ensure directory exists
-                db_dir = os.path.dirname(os.path.abspath(self.storage_path))
-                if db_dir and not os.path.exists(db_dir):
-                    os.makedirs(db_dir, exist_ok=True)
-                # connect with check_same_thread False to allow access from sampler thread
-                self._db_conn = sqlite3.connect(self.storage_path, check_same_thread=False, timeout=30)
-                self._db_conn.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS snapshots (
-                        id INTEGER PRIMARY KEY,
-                        ts TEXT NOT NULL,
-                        t REAL NOT NULL,
-                        snapshot TEXT NOT NULL
-                    )
-                    """
-                )
-                self._db_conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_t ON snapshots(t)")
-                self._db_conn.commit()
-                # load recent history from DB
+                self.db = SampleDB(self.storage_path, flush_interval=flush_interval, flush_batch=flush_batch,
+                                   read_only=read_only)
+                # load recent rollups and history from DB
                 self._load_history_from_db()
             except Exception as e:
                 print('Failed to initialize DB persistence:', e)
                 self.persist = False
-        self._sampler_thread = threading.Thread(target=self._sampler_loop, daemon=True)
+        if not self.db:
+            self.history_warm.set()
+        self.startup['ready_seconds'] = round(time.monotonic() - self._init_started, 3)
+        self.startup['ready_samples'] = len(self.history)
+        if self._hydrate_args:
+            threading.Thread(target=self._hydrate, args=self._hydrate_args, daemon=True).start()
+
+    def ingest(self, snapshot, stats=None):
+        """Record one snapshot: history, rollups, stream subscribers and DB.
+
+        stats, when given, becomes the latest /stats payload for this host.
+        """
+        if stats is not None:
+            self._latest = (time.monotonic(), stats)
+
+        # per-device rates from the cumulative counters; a sampler's snapshots already carry them
+        if 'devices' not in snapshot and ('disk_io' in snapshot or 'nics' in snapshot):
+            rates = device_rates(self._prev_counters, snapshot, self.skip_nics)
+            self._prev_counters = {k: snapshot.get(k) for k in ('t', 'disk_io', 'nics')}
+            if rates:
+                snapshot['devices'] = rates
+        if snapshot.get('devices'):
+            self.devices.push(snapshot['t'], snapshot['devices'])
+
+        # the store copies values into its columns, so no defensive copy is needed
+        self.history.append(snapshot)
+        self.last_snapshot = snapshot
+        closed = self.rollups.add(snapshot)
+        try:
+            self._publish(snapshot)
+        except Exception as e:
+            print('Stream publish error:', e)
+        if self.alerts is not None:
+            try:
+                self.alerts.evaluate(snapshot)
+            except Exception as e:
+                print('Alert evaluation error:', e)
+
+        # persist to DB (best-effort)
+        if self.persist and self.db and not self.read_only:
+            try:
+                self._save_snapshot_to_db(snapshot)
+                if closed:
+                    self.db.save_rollups(closed)
+            except Exception as e:
+                # don't crash sampling on DB errors
+                print('DB save error:', e)
+
+    def get_stats(self):
+        """Return the latest /stats payload recorded by ingest(), or None."""
+        latest = self._latest
+        return latest[1] if latest else None
+
+    def _publish(self, snapshot):
+        """Push one chart point (plus the /stats payload) to stream subscribers."""
+        t = snapshot['t']
+        recv = snapshot['net']['bytes_recv']
+        sent = snapshot['net']['bytes_sent']
+        net_rx = net_tx = 0
+        if self._prev_net is not None:
+            pt, precv, psent = self._prev_net
+            dt = t - pt if t - pt > 0 else 1
+            net_rx = round((recv - precv) / dt / (1024*1024), 4)
+            net_tx = round((sent - psent) / dt / (1024*1024), 4)
+        self._prev_net = (t, recv, sent)
+        latest = self._latest
+        self.events.publish(t, {
+            't': t,
+            'ts': snapshot['ts'],
+            'cpu': round(snapshot['cpu']['avg'], 2),
+            'memory': round(snapshot['memory']['percent'], 2),
+            'net_rx': net_rx,
+            'net_tx': net_tx,
+            'stats': latest[1] if latest else None
+        })
+
+    def latest_sample_time(self):
+        """Timestamp of the newest in-memory sample, or None."""
+        return self.history.last_time()
+
+    @staticmethod
+    def _to_epoch(value, default):
+        """Normalize a datetime / timestamp / None range bound to a float epoch."""
+        if value is None:
+            return default
+        if isinstance(value, datetime):
+            return value.timestamp()
+        return float(value)
+
+    def get_history(self, start_ts=None, end_ts=None):
+        """Return snapshots between start_ts and end_ts.
+        start_ts and end_ts can be datetime objects or timestamps (float) or None.
+        The range is located by binary search, so only matching samples are read.
+        """
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        cold = self._cold_history(start, end)
+        if cold is not None:
+            return cold
+        if not self.history:
+            return []
+        return self.history.select(start, end)
+
+    # Persistence helpers
+
+    def _save_snapshot_to_db(self, snapshot):
+        """Queue snapshot for the next batched write to the sqlite DB."""
+        if not self.db:
+            return
+        self.db.save(snapshot)
+
+    def _load_history_from_db(self):
+        """Load persisted rollups and the newest samples, then hydrate the rest in the background.
+
+        Only the samples needed to rebuild the rollup buckets that were still
+        open at shutdown are replayed here, so startup cost does not grow with
+        the size of the DB. Older history is read newest-to-oldest in chunks by
+        `_hydrate`, started once the store is ready; until it finishes, `history_warm` is unset and raw history
+        queries reaching further back are answered from SQLite.
+        """
+        if not self.db:
+            return
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=self.max_days)
+            cutoff_ts = cutoff.timestamp()
+            replay_from = float('inf')
+            for name, tier in self.rollups.tiers.items():
+                for row in self.db.load_rollups(name, cutoff_ts):
+                    tier.push(row)
+                last = tier.last_closed()
+                replay_from = min(replay_from, last + tier.seconds if last is not None else cutoff_ts)
+            closed = []
+            tail_from = max(cutoff_ts, replay_from)
+            tail = self.db.load_snapshots(tail_from)
+            for snap in tail:
+                self.history.append(snap)
+                closed.extend(self.rollups.add(snap))
+            if closed and not self.read_only:
+                self.db.save_rollups(closed)
+        except Exception as e:
+            print('DB load error:', e)
+            self.history_warm.set()
+            return
+        # everything from tail_from on is in memory (or arrives from the sampler); never
+        # hydrate past it, or samples flushed by load_snapshots in the meantime come back twice
+        self._hydrate_args = (tail[0]['t'] if tail else tail_from, cutoff_ts)
+
+    def catch_up(self, stats=None):
+        """Read-only stores: ingest the samples the writing process has flushed
+        since the newest one in memory. Returns the number of samples added.
+
+        stats: optional function building the /stats payload from a snapshot.
+        """
+        if not self.db or not self.read_only:
+            return 0
+        last = self.history.last_time()
+        if last is not None:
+            start = math.nextafter(last, math.inf)
+        elif self._hydrate_args:
+            # everything older is left to _hydrate
+            start = self._hydrate_args[0]
+        else:
+            start = (datetime.utcnow() - timedelta(days=self.max_days)).timestamp()
+        snaps = self.db.load_snapshots(start)
+        for snap in snaps:
+            self.ingest(snap, stats(snap) if stats else None)
+        return len(snaps)
+
+    def _hydrate(self, before, cutoff_ts, chunk=5000):
+        """Fill history with samples older than `before`, newest chunk first."""
+        loaded = 0
+        try:
+            while True:
+                snaps = self.db.load_snapshots_before(before, cutoff_ts, chunk)
+                if not snaps:
+                    break
+                stored = self.history.extendleft(snaps)
+                loaded += stored
+                before = snaps[0]['t']
+                if stored < len(snaps):
+                    break
+        except Exception as e:
+            # leave history cold: older ranges keep being served from SQLite
+            print('History hydration error:', e)
+            return
+        self.history_warm.set()
+        self.startup['hydrated_seconds'] = round(time.monotonic() - self._init_started, 3)
+        self.startup['hydrated_samples'] = loaded + self.startup['ready_samples']
+        print(f"{self.storage_path}: serving after {self.startup['ready_seconds']}s, "
+              f"{self.startup['hydrated_samples']} samples loaded after {self.startup['hydrated_seconds']}s")
+
+    def _cold_history(self, start, end):
+        """Snapshots for [start, end] while hydration is still running, else None.
+
+        The part older than the in-memory history is read from SQLite.
+        """
+        if self.history_warm.is_set() or not self.db:
+            return None
+        first = self.history.first_time()
+        if first is not None and start >= first:
+            return None
+        upto = end if first is None else min(end, math.nextafter(first, -float('inf')))
+        snaps = self.db.load_snapshots(start, upto)
+        if first is not None and end >= first:
+            snaps.extend(self.history.select(first, end))
+        return snaps
+
+    def _cleanup_old_snapshots(self):
+        """Drop DB partitions older than the retention period; returns the cleanup report."""
+        if not self.db or self.read_only:
+            return None
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=self.max_days)
+            burst_cutoff = datetime.utcnow().timestamp() - self.burst.retention if self.burst else None
+            report = self.db.cleanup(cutoff.timestamp(), burst_cutoff_ts=burst_cutoff)
+        except Exception as e:
+            print('DB cleanup error:', e)
+            return None
+        report['at'] = datetime.utcnow().isoformat() + 'Z'
+        self.last_retention = report
+        if report['dropped']:
+            print(f"{self.storage_path}: dropped {len(report['dropped'])} day partitions, "
+                  f"reclaimed {report['reclaimed_bytes']} bytes ({report['file_bytes']} bytes left)")
+        return report
+
+    def close(self):
+        """Flush pending samples and close the DB connection if open."""
+        try:
+            if self.db:
+                self.db.close()
+                self.db = None
+        except Exception:
+            pass
+
+    def get_time_series(self, start_ts=None, end_ts=None, max_points=None, resolution=None, downsample='lttb',
+                        since=None, with_times=False):
+        """Build time-series arrays for charts between start and end (epoch or datetime).
+        Returns: {labels: [...], cpu: [...], memory: [...], net_rx: [...], net_tx: [...]} where net values are MB/s.
+
+        resolution: 'raw', 'burst' (high-resolution samples recorded during bursts,
+        see BurstSampler) or a rollup tier name ('1m', '5m', '1h'). When omitted and
+        max_points is given, the coarsest tier with at least max_points buckets in the
+        range is used, if its buckets span at least ROLLUP_MIN_REDUCTION samples
+        (otherwise raw samples are downsampled). Rollup responses also carry <metric>_min / <metric>_max arrays.
+        downsample: 'lttb' reduces the result to max_points, anything else disables it.
+        since: epoch cursor; only points strictly newer than it are returned. Every
+        response carries `cursor`, the timestamp to pass as `since` next time.
+        with_times: also return the sample timestamps as `t` (for compact.pack_series).
+        """
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        if since is not None:
+            start = max(start, math.nextafter(float(since), float('inf')))
+
+        if resolution is None and max_points:
+            # clamp open-ended bounds to the data we actually have
+            lo = start if start != -float('inf') else (self.history.first_time() or 0)
+            hi = end if end != float('inf') else time.time()
+            # a tier must cut the rows at least ROLLUP_MIN_REDUCTION-fold to beat raw + LTTB
+            resolution = self.rollups.choose(lo, hi, max_points, ROLLUP_MIN_REDUCTION * self.sample_interval)
+
+        if resolution == 'burst':
+            series = self._burst_series(start, end)
+        elif resolution and resolution != 'raw' and resolution in self.rollups.tiers:
+            series = self._rollup_series(resolution, start, end, max_points if downsample == 'lttb' else None)
+        else:
+            series = self._raw_series(start, end)
+
+        if downsample == 'lttb' and max_points and len(series['labels']) > max_points:
+            # choose points on the CPU line and keep every series aligned to them
+            x = list(range(len(series['labels'])))
+            keep = lttb_indices(x, series['cpu'], max_points)
+            series = {k: [v[i] for i in keep] if isinstance(v, list) else v for k, v in series.items()}
+        t = series.pop('_t')
+        series['cursor'] = t[-1] if t else since
+        if with_times:
+            series['t'] = t
+        return series
+
+    def _rollup_series(self, tier, start, end, max_points=None):
+        """Time series from a rollup tier: avg under the usual keys plus min/max arrays.
+
+        With max_points, LTTB picks the buckets on the avg CPU column before
+        any value is rounded or copied into the result lists.
+        """
+        cols = self.rollups.tiers[tier].columns(start, end)
+        t = cols['t']
+        keep = range(len(t))
+        if max_points and len(t) > max_points:
+            cpu = cols['cpu_avg']
+            keep = lttb_indices(keep, [0.0 if math.isnan(v) else v for v in cpu], max_points)
+
+        def rnd(column, ndigits):
+            return [None if math.isnan(column[i]) else round(column[i], ndigits) for i in keep]
+
+        kept_t = [t[i] for i in keep]
+        series = {
+            'resolution': tier,
+            '_t': kept_t,
+            'labels': [datetime.fromtimestamp(x).isoformat() + 'Z' for x in kept_t],
+        }
+        for metric, ndigits in (('cpu', 2), ('memory', 2), ('net_rx', 4), ('net_tx', 4)):
+            series[metric] = rnd(cols[f'{metric}_avg'], ndigits)
+            series[f'{metric}_min'] = rnd(cols[f'{metric}_min'], ndigits)
+            series[f'{metric}_max'] = rnd(cols[f'{metric}_max'], ndigits)
+        return series
+
+    def _history_for(self, start, end, with_previous=False):
+        """The HistoryStore to read [start, end] from: self.history, or while it is still
+        cold a temporary store filled from SQLite (with_previous: plus the sample before start).
+        """
+        cold = self._cold_history(start, end)
+        if cold is None:
+            return self.history
+        if with_previous:
+            cold = self.db.load_snapshots_before(start, -float('inf'), 1) + cold
+        history = HistoryStore(maxlen=max(1, len(cold)))
+        for snap in cold:
+            history.append(snap)
+        return history
+
+    def _history_columns(self, start, end, with_disk=False):
+        """HistoryStore.columns(start, end, with_previous=True), from SQLite while history is cold."""
+        # with the sample just before the range, so the first rate is real
+        history = self._history_for(start, end, with_previous=True)
+        return history.columns(start, end, with_previous=True, with_disk=with_disk)
+
+    def get_percpu_heatmap(self, start_ts=None, end_ts=None, columns=300, agg='avg'):
+        """Per-core CPU heatmap over a range, computed with NumPy.
+
+        The samples are split into at most about `columns` time buckets (never
+        shorter than the sample interval) and each cell is the avg or max
+        utilization of one core in one bucket, in whole percent.
+        Returns {cores, agg, bucket (seconds), labels: [...], values: [[per-core %] per bucket]}.
+        """
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        cols = self._history_for(start, end).percpu(start, end)
+        t = cols['t']
+        bucket = self.sample_interval
+        if len(t) > 1:
+            bucket = max(bucket, math.ceil((t[-1] - t[0] + 1) / max(1, columns)))
+        bucket_t, matrix = aggregate.heatmap(t, cols['values'], cols['cores'], bucket, agg)
+        return {
+            'cores': cols['cores'],
+            'agg': agg,
+            'bucket': bucket,
+            'labels': [datetime.fromtimestamp(x).isoformat() + 'Z' for x in bucket_t.tolist()],
+            'values': matrix.tolist(),
+        }
+
+    def get_aggregate_series(self, start_ts=None, end_ts=None, agg='avg', bucket=300, window=5, since=None,
+                             with_times=False):
+        """Bucketed statistics of the raw samples, computed with NumPy.
+
+        agg: one of aggregate.AGGS (min, avg, max, p50, p95, p99, or ma: moving
+        average of the bucket averages over `window` buckets); bucket: width in
+        seconds. Returns {labels, cpu, memory, net_rx, net_tx, disk, agg,
+        resolution, cursor}; net values are MB/s and disk is used percent.
+        With since, only buckets starting at or after the cursor are returned; the
+        cursor is the newest bucket, which is sent again as it fills up.
+        with_times: also return the bucket start times as `t`.
+        """
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        if since is not None:
+            # recompute from the start of the bucket the cursor points into
+            start = max(start, math.floor(float(since) / bucket) * bucket)
+        t, values = aggregate.metric_arrays(self._history_columns(start, end, with_disk=True))
+        bucket_t, series = aggregate.bucketize(t, values, bucket, agg, window)
+        if since is not None:
+            keep = bucket_t >= float(since)
+            bucket_t = bucket_t[keep]
+            series = {k: v[keep] for k, v in series.items()}
+        out = {
+            'agg': agg,
+            'resolution': f'{bucket}s',
+            'labels': [datetime.fromtimestamp(x).isoformat() + 'Z' for x in bucket_t.tolist()],
+            'cursor': float(bucket_t[-1]) if len(bucket_t) else since,
+        }
+        for metric, ndigits in (('cpu', 2), ('memory', 2), ('net_rx', 4), ('net_tx', 4), ('disk', 2)):
+            out[metric] = aggregate.to_list(series[metric], ndigits)
+        if with_times:
+            out['t'] = bucket_t.tolist()
+        return out
+
+    def get_summary(self, start_ts=None, end_ts=None):
+        """min / avg / max / p50 / p95 / p99 / last per metric over the range (NumPy)."""
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        t, values = aggregate.metric_arrays(self._history_columns(start, end, with_disk=True))
+        return {
+            'start': datetime.fromtimestamp(float(t[0])).isoformat() + 'Z' if len(t) else None,
+            'end': datetime.fromtimestamp(float(t[-1])).isoformat() + 'Z' if len(t) else None,
+            'metrics': aggregate.summarize(values),
+        }
+
+    def _burst_series(self, start, end):
+        """Time series of the high-resolution burst samples (from the DB when not sampling here)."""
+        if self.burst:
+            rows = self.burst.tier.select(start, end)
+        elif self.db:
+            try:
+                loaded = self.db.load_burst(start, end)
+            except Exception:
+                # older read-only DB without the burst table
+                loaded = []
+            rows = {c: [r[c] for r in loaded] for c in ('t',) + BURST_COLUMNS}
+        else:
+            rows = {c: [] for c in ('t',) + BURST_COLUMNS}
+
+        def rnd(values, ndigits):
+            return [round(v, ndigits) if v is not None else None for v in values]
+
+        return {
+            'resolution': 'burst',
+            '_t': rows['t'],
+            'labels': [datetime.fromtimestamp(x).isoformat() + 'Z' for x in rows['t']],
+            'cpu': rnd(rows['cpu'], 2),
+            'memory': rnd(rows['memory'], 2),
+            'net_rx': rnd(rows['net_rx'], 4),
+            'net_tx': rnd(rows['net_tx'], 4),
+        }
+
+    def _raw_series(self, start, end):
+        """Time series built from raw samples (vectorised with NumPy when installed).
+
+        Network rates use the sample preceding the range when there is one, so
+        the first point (e.g. right after a `since` cursor) is a real rate.
+        """
+        cols = self._history_columns(start, end)
+        t = list(cols['t'])
+        recv = cols['bytes_recv']
+        sent = cols['bytes_sent']
+        first = 1 if cols['previous'] else 0
+        if len(t) <= first:
+            return {'resolution': 'raw', '_t': [], 'labels': [], 'cpu': [], 'memory': [], 'net_rx': [], 'net_tx': []}
+
+        labels = [datetime.fromtimestamp(x).isoformat() + 'Z' for x in t[first:]]
+        if aggregate.available():
+            series = aggregate.raw_series(cols)
+            return {'resolution': 'raw', '_t': t[first:], 'labels': labels, **series}
+
+        cpu = [round(v, 2) for v in cols['cpu_avg'][first:]]
+        memory = [round(v, 2) for v in cols['mem_percent'][first:]]
+
+        # compute network rates by differences between consecutive snapshots
+        net_rx = [] if first else [0]
+        net_tx = [] if first else [0]
+        for i in range(1, len(t)):
+            dt = t[i] - t[i-1] if t[i] - t[i-1] > 0 else 1
+            rx_rate = (recv[i] - recv[i-1]) / dt
+            tx_rate = (sent[i] - sent[i-1]) / dt
+            # convert to MB/s
+            net_rx.append(round(rx_rate / (1024*1024), 4))
+            net_tx.append(round(tx_rate / (1024*1024), 4))
+
+        return {'resolution': 'raw', '_t': t[first:], 'labels': labels, 'cpu': cpu, 'memory': memory,
+                'net_rx': net_rx, 'net_tx': net_tx}
+
+    def metrics_lines(self):
+        """Prometheus text lines for the latest sample and the store's own size."""
+        lines = []
+        lines += family('sysmon_history_samples', 'Samples held in memory.', len(self.history))
+        lines += family('sysmon_history_capacity', 'Samples the in-memory history can hold.', self.history.maxlen)
+        if self.db:
+            size = 0
+            for path in (self.storage_path, self.storage_path + '-wal'):
+                try:
+                    size += os.path.getsize(path)
+                except OSError:
+                    pass
+            lines += family('sysmon_db_file_bytes', 'Size of the SQLite file and its WAL.', size)
+        # ready: serving requests; hydrated: all DB history loaded (NaN until then)
+        stages = ('ready', 'hydrated')
+        lines += family('sysmon_startup_seconds', 'Seconds from start until the store reached each stage.',
+                        [((st,), self.startup[f'{st}_seconds']) for st in stages], ('stage',))
+        lines += family('sysmon_startup_samples', 'Samples in memory when the store reached each stage.',
+                        [((st,), self.startup[f'{st}_samples']) for st in stages], ('stage',))
+        lines += family('sysmon_history_warm', '1 once history holds everything the DB has.',
+                        int(self.history_warm.is_set()))
+        s = self.last_snapshot
+        if s is None:
+            return lines
+        lines += family('sysmon_last_sample_timestamp_seconds', 'Time of the latest sample.', s['t'])
+
+        cpu = s.get('cpu') or {}
+        lines += family('sysmon_cpu_percent', 'CPU utilization, all cores.', cpu.get('avg'))
+        lines += family('sysmon_cpu_core_percent', 'CPU utilization per core.',
+                        [((i,), v) for i, v in enumerate(cpu.get('percpu') or [])], ('core',))
+        mem = s.get('memory') or {}
+        lines += family('sysmon_memory_percent', 'Memory in use.', mem.get('percent'))
+        lines += family('sysmon_memory_bytes', 'Memory by state.',
+                        [((k,), mem.get(k)) for k in ('total', 'available', 'used')], ('state',))
+        swap = s.get('swap') or {}
+        if swap:
+            lines += family('sysmon_swap_bytes', 'Swap by state.',
+                            [((k,), swap.get(k)) for k in ('total', 'used', 'free')], ('state',))
+        disk = s.get('disk') or {}
+        lines += family('sysmon_disk_bytes', 'Filesystem space by mountpoint and state.',
+                        [((mount, k), info.get(k)) for mount, info in sorted(disk.items())
+                         for k in ('total', 'used', 'free')], ('mountpoint', 'state'))
+        net = s.get('net') or {}
+        lines += family('sysmon_network_bytes_total', 'Bytes received / sent, all interfaces.',
+                        [(('rx',), net.get('bytes_recv')), (('tx',), net.get('bytes_sent'))],
+                        ('direction',), kind='counter')
+        if s.get('load'):
+            lines += family('sysmon_load_average', 'System load average.',
+                            list(zip((('1m',), ('5m',), ('15m',)), s['load'])), ('period',))
+        rates = s.get('devices') or {}
+        if rates:
+            lines += family('sysmon_device_rate', 'Per-disk / per-interface rates (see devices.KINDS).',
+                            [((kind, name, m), v) for kind, devices in sorted(rates.items())
+                             for name, r in sorted(devices.items()) for m, v in r.items()],
+                            ('kind', 'device', 'metric'))
+        return lines
+
+    def device_names(self):
+        """{'disk_io': [...], 'net_io': [...]}: devices with rates in memory or in the DB."""
+        names = self.devices.devices()
+        if self.db:
+            try:
+                for kind, stored in self.db.device_names().items():
+                    names[kind] = sorted(set(names[kind]) | set(stored))
+            except Exception as e:
+                print('DB device list error:', e)
+        return names
+
+    def get_device_series(self, kind, device, start_ts=None, end_ts=None, max_points=None, downsample='lttb',
+                          since=None, with_times=False):
+        """Rate series of one block device (kind 'disk_io') or network interface ('net_io').
+
+        Returns {metric, device, labels, cursor, <rate>: [...]} with the rates of
+        devices.KINDS[kind]; range, max_points, downsample, since and with_times
+        behave as in get_time_series. Samples older than the in-memory rates
+        are read from the DB.
+        """
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        if since is not None:
+            start = max(start, math.nextafter(float(since), float('inf')))
+        metrics = DEVICE_KINDS[kind]
+
+        rows = {'t': []}
+        rows.update({m: [] for m in metrics})
+        first = self.devices.first_time()
+        parts = []
+        if self.db and (first is None or start < first):
+            upto = end if first is None else min(end, math.nextafter(first, -float('inf')))
+            try:
+                parts.append(self.db.load_device_rates(kind, device, start, upto))
+            except Exception as e:
+                print('DB device load error:', e)
+        if first is not None and end >= first:
+            parts.append(self.devices.select(kind, device, max(start, first), end))
+        for part in parts:
+            for k in rows:
+                rows[k].extend(part[k])
+
+        t = rows.pop('t')
+        series = {'metric': kind, 'device': device}
+        series['labels'] = [datetime.fromtimestamp(x).isoformat() + 'Z' for x in t]
+        for m in metrics:
+            series[m] = [round(v, 4) if v is not None else None for v in rows[m]]
+
+        if downsample == 'lttb' and max_points and len(t) > max_points:
+            # choose points on the total throughput and keep every series aligned to them
+            a, b = metrics[2:4] if kind == 'disk_io' else metrics[0:2]
+            y = [(x or 0) + (z or 0) for x, z in zip(series[a], series[b])]
+            keep = lttb_indices(list(range(len(t))), y, max_points)
+            t = [t[i] for i in keep]
+            series = {k: [v[i] for i in keep] if isinstance(v, list) else v for k, v in series.items()}
+        series['cursor'] = t[-1] if t else since
+        if with_times:
+            series['t'] = t
+        return series
+
+    def export_rows(self, start_ts=None, end_ts=None, metrics=export.DEFAULT_METRICS, chunk=1000):
+        """Stream the stored samples between start and end as chunks of (t, <metric>...) rows
+        (see export.rows), read `chunk` rows at a time. None when there is no DB to read from.
+        """
+        if not self.db:
+            return None
+        start = self._to_epoch(start_ts, -float('inf'))
+        end = self._to_epoch(end_ts, float('inf'))
+        return export.rows(self.db.iter_samples(start, end, with_disk='disk' in metrics, chunk=chunk), metrics)
+
+
+class SystemMonitor(MetricStore):
+    def __init__(self, sample_interval=60, max_days=7, storage_path='monitor.db', persist=True,
+                 flush_interval=None, flush_batch=100, stats_max_age=None, services=None, services_ttl=10,
+                 role='standalone', shm_path=None, shm_window=120, retention_interval=3600,
+                 burst_sampling=True, burst_options=None, alerts=None, collector_options=None, skip_nics=None):
+        """Create monitor, start background sampler.
+        sample_interval: sampling interval in seconds (default 5s)
+        max_days: how many days of history to keep (default 7 days)
+        flush_interval / flush_batch: samples are written to SQLite in one transaction
+        every flush_interval seconds (default 5 samples, at least 30s) or flush_batch
+        samples, whichever comes first
+        stats_max_age: how old (seconds) the sampler's latest stats may be before
+        get_stats() collects live data instead (default 2 * sample_interval)
+        services: systemd units reported by get_service_status (default DEFAULT_SERVICES)
+        services_ttl: seconds a get_service_status result is reused
+        role: 'standalone' samples and serves in one process (default). For multi-worker
+        deployments run one 'sampler' (sampler.py), which also publishes the latest stats
+        and the last shm_window snapshots to the shared segment at shm_path, and any
+        number of 'replica' web workers, which load history read-only from the DB and
+        follow the segment instead of sampling.
+        retention_interval: seconds between runs of the DB retention (partition drop)
+        burst_sampling: probe cheap counters between snapshots and record sub-second samples
+        while CPU / memory / network triggers fire; burst_options are BurstSampler arguments
+        alerts: AlertEngine (see alerts.load_alerts) evaluated on every sample. Replicas
+        evaluate it for /alerts but drop its notifiers: the sampler sends notifications
+        collector_options: per-collector {'interval': seconds, 'timeout': seconds} overrides,
+        or None to disable one (see collectors.DEFAULT_COLLECTORS)
+        skip_nics: interface name prefixes without per-device rates (default devices.SKIP_NICS)
+        """
+        if role not in ('standalone', 'sampler', 'replica'):
+            raise ValueError(f'unknown role: {role}')
+        self.role = role
+        self.ssh = None
+        self.retention_interval = retention_interval
+        if skip_nics is not None:
+            self.skip_nics = tuple(skip_nics)
+        if burst_sampling and role != 'replica':
+            self.burst = BurstSampler(**(burst_options or {}))
+        if alerts is not None and role == 'replica':
+            alerts.notifiers = []
+        self.alerts = alerts
+        self.stats_max_age = stats_max_age if stats_max_age is not None else 2 * sample_interval
+        self.services = list(services) if services is not None else list(DEFAULT_SERVICES)
+        self.services_ttl = services_ttl
+        self._services_cache = None
+        self._services_lock = threading.Lock()
+        self._services_pool = ThreadPoolExecutor(max_workers=1)
+        # cached process table shared by the services page and /processes
+        self.processes = ProcessTracker()
+        self.collectors = default_registry(collector_options) if role != 'replica' else None
+        self._shm = None
+        self._shm_window = collections.deque(maxlen=shm_window)
+        if role == 'sampler':
+            self._shm = SharedSnapshotWriter(shm_path or SHM_PATH)
+        elif role == 'replica':
+            self._shm = SharedSnapshotReader(shm_path or SHM_PATH)
+        super().__init__(sample_interval, max_days, storage_path, persist, flush_interval, flush_batch,
+                         read_only=(role == 'replica'))
+        if self.burst and self.db:
+            try:
+                for row in self.db.load_burst(datetime.utcnow().timestamp() - self.burst.retention):
+                    self.burst.tier.push(row)
+            except Exception as e:
+                print('Burst load error:', e)
+        target = self._follow_loop if role == 'replica' else self._sampler_loop
+        self._sampler_thread = threading.Thread(target=target, daemon=True)
         self._sampler_thread.start()
+        if self.db and not self.read_only:
+            self._retention_thread = threading.Thread(target=self._retention_loop, daemon=True)
+            self._retention_thread.start()
 
     def connect_ssh(self, hostname, username, password):
         """Connect to remote Ubuntu server via SSH"""
@@ -77,99 +780,135 @@ class SystemMonitor:
 
     def _take_snapshot(self):
         """Take a single timestamped snapshot and append to history."""
+        with SNAPSHOT_SECONDS.time():
+            snapshot = self._collect_snapshot()
+        SNAPSHOTS.inc('ok' if snapshot is not None else 'error')
+        return snapshot
+
+    def _collect_snapshot(self):
+        """Collect, ingest and publish one snapshot; None when it failed."""
         try:
             now = datetime.utcnow()
-            ts = now.isoformat() + 'Z'
+            values = self.collectors.collect()
+            missing = [k for k in REQUIRED_COLLECTORS if k not in values]
+            if missing:
+                # failed, hung or never reported: don't record their last value as a new sample
+                print('Snapshot skipped, no fresh data from:', ', '.join(missing))
+                return None
 
-            # CPU - non-blocking
-            percpu = psutil.cpu_percent(interval=None, percpu=True)
-            avg = sum(percpu) / len(percpu) if percpu else 0.0
-            freq = psutil.cpu_freq()
+            snapshot = {'ts': now.isoformat() + 'Z', 't': now.timestamp()}
+            snapshot.update(values)
+            # disk usage can hang on network mounts; until it reports (again), record no mounts
+            snapshot.setdefault('disk', {})
 
-            mem = psutil.virtual_memory()
-
-            # disk partitions
-            partitions = psutil.disk_partitions()
-            disk_info = {}
-            for partition in partitions:
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    if partition.fstype != 'squashfs':
-                        disk_info[partition.mountpoint] = {
-                            'device': partition.device,
-                            'total': usage.total,
-                            'used': usage.used,
-                            'free': usage.free,
-                            'percent': usage.percent,
-                            'fstype': partition.fstype
-                        }
-                except Exception:
-                    continue
-
-            net = psutil.net_io_counters()
-
-            snapshot = {
-                'ts': ts,
-                't': now.timestamp(),
-                'cpu': {
-                    'avg': avg,
-                    'percpu': percpu,
-                    'frequency': {
-                        'current': freq.current if freq else None,
-                        'min': freq.min if freq else None,
-                        'max': freq.max if freq else None
-                    },
-                    'cores': psutil.cpu_count(logical=False),
-                    'logical_cores': psutil.cpu_count(logical=True)
-                },
-                'memory': {
-                    'total': mem.total,
-                    'available': mem.available,
-                    'used': mem.used,
-                    'percent': mem.percent
-                },
-                'disk': disk_info,
-                'net': {
-                    'bytes_sent': net.bytes_sent,
-                    'bytes_recv': net.bytes_recv
-                }
-            }
-
-            # append a deep copy to avoid later mutation issues
-            snap_copy = copy.deepcopy(snapshot)
-            self.history.append(snap_copy)
+            try:
+                stats = self._build_stats(snapshot)
+            except Exception as e:
+                print('Stats cache error:', e)
+                stats = None
+            self.ingest(snapshot, stats)
 
-            # persist to DB (best-effort)
-            if self.persist and self._db_conn:
+            if self.role == 'sampler':
+                self._shm_window.append(snapshot)
                 try:
-                    self._save_snapshot_to_db(snap_copy)
+                    self._shm.publish(stats, self._shm_window)
                 except Exception as e:
-                    # don't crash sampling on DB errors
-                    print('DB save error:', e)
+                    print('Shared snapshot error:', e)
 
             return snapshot
         except Exception as e:
             print('Snapshot error:', e)
             return None
 
+    def _build_stats(self, snapshot):
+        """Build the /stats payload for this snapshot, adding swap, packets and connections."""
+        net = snapshot['net']
+        stats = {
+            'ts': snapshot['ts'],
+            'cpu': snapshot['cpu'],
+            'memory': dict(snapshot['memory'], swap=snapshot.get('swap')),
+            'disk': snapshot['disk'],
+            'network': {
+                'bytes_sent': round(net['bytes_sent'] / (1024*1024), 4),
+                'bytes_recv': round(net['bytes_recv'] / (1024*1024), 4),
+                'packets_sent': net.get('packets_sent'),
+                'packets_recv': net.get('packets_recv'),
+                'active_connections': snapshot.get('connections')
+            }
+        }
+        return stats
+
+    def get_stats(self):
+        """Return the /stats payload (cpu, memory, disk, network).
+
+        Served from the sampler's latest snapshot while it is at most
+        stats_max_age seconds old; otherwise collected live.
+        """
+        latest = self._latest
+        if latest and time.monotonic() - latest[0] <= self.stats_max_age:
+            return latest[1]
+        return {
+            'cpu': self.get_cpu_info(),
+            'memory': self.get_memory_info(),
+            'disk': self.get_disk_info(),
+            'network': self.get_network_info()
+        }
+
     def _sampler_loop(self):
         # take an initial quick snapshot to seed cpu counters
         try:
             psutil.cpu_percent(interval=None)
         except Exception:
             pass
+        next_snapshot = time.monotonic()
+        while True:
+            if time.monotonic() >= next_snapshot:
+                self._take_snapshot()
+                next_snapshot = time.monotonic() + self.sample_interval
+            delay = next_snapshot - time.monotonic()
+            if self.burst:
+                # cheap probes between snapshots; sub-second while a burst is active
+                try:
+                    delay = min(delay, self.burst.probe())
+                    self._save_burst()
+                except Exception as e:
+                    print('Burst probe error:', e)
+            time.sleep(max(0, delay))
+
+    def _save_burst(self):
+        """Write recorded burst rows to the DB."""
+        rows = self.burst.take_pending()
+        if rows and self.persist and self.db and not self.read_only:
+            self.db.save_burst(rows)
+
+    def _retention_loop(self):
+        """Drop expired DB partitions once at startup and then every retention_interval seconds."""
+        while True:
+            self._cleanup_old_snapshots()
+            time.sleep(self.retention_interval)
+
+    def _follow_loop(self):
+        """Replica role: ingest snapshots the sampler process publishes to shared memory."""
+        last_seq = None
+        poll = min(1.0, max(0.05, self.sample_interval / 4))
         while True:
-            snap = self._take_snapshot()
-            # occasional cleanup of old DB rows (once every 60 samples)
             try:
-                if self.persist and self._db_conn:
-                    # perform cleanup roughly every 60 samples
-                    if int(time.time()) % max(60, int(self.sample_interval)) == 0:
-                        self._cleanup_old_snapshots()
-            except Exception:
+                seq = self._shm.sequence()
+                if seq != last_seq:
+                    got = self._shm.read()
+                    if got and got[1]:
+                        last_seq = got[0]
+                        payload = got[1]
+                        last_t = self.latest_sample_time()
+                        fresh = [s for s in payload['snapshots'] if last_t is None or s['t'] > last_t]
+                        for i, snap in enumerate(fresh):
+                            self.ingest(snap, payload['stats'] if i == len(fresh) - 1 else None)
+            except (OSError, ValueError):
+                # segment not created yet (sampler not started) or being replaced
                 pass
-
-            time.sleep(self.sample_interval)
+            except Exception as e:
+                print('Shared snapshot read error:', e)
+            time.sleep(poll)
 
     def get_cpu_info(self):
         """Get CPU information"""
@@ -254,193 +993,65 @@ class SystemMonitor:
         scans local processes for Python-based runners (gunicorn, uwsgi, uvicorn, python)
         and adds them to the returned mapping as `<script> (pid <n>)`: 'active'.
 
+        Results are cached for services_ttl seconds and shared by all callers;
+        concurrent callers on an expired cache wait for a single refresh.
+
         Note: Python process detection is local only. If the monitor is connected to a
         remote host via SSH (`self.ssh`), systemctl checks will run remotely but Python
         process detection will still reflect the local host where this code runs.
         """
-        important_services = [
-            'nginx', 'apache2', 'mysql', 'postgresql',
-            'mongodb', 'redis-server', 'ssh', 'ufw'
-        ]
+        cached = self._services_cache
+        if cached and time.monotonic() - cached[0] < self.services_ttl:
+            return cached[1]
+        with self._services_lock:
+            cached = self._services_cache
+            if cached and time.monotonic() - cached[0] < self.services_ttl:
+                return cached[1]
+            with SERVICE_STATUS_SECONDS.time():
+                result = self._collect_service_status()
+            self._services_cache = (time.monotonic(), result)
+            return result
 
-        services_status = {}
+    def _systemd_states(self, services):
+        """Query all units with a single `systemctl is-active` call (remote via SSH if configured).
 
-        # Check system services (remote via SSH if configured)
-        for service in important_services:
-            cmd = f"systemctl is-active {service}"
-            try:
-                if self.ssh:
-                    out = self.execute_command(cmd)
-                else:
-                    proc = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                    out = proc.stdout
-                if out:
-                    services_status[service] = out.strip()
-            except Exception:
-                services_status[service] = 'unknown'
+        systemctl prints one state per unit, in argument order.
+        """
+        if not services:
+            return {}
+        try:
+            if self.ssh:
+                out = self.execute_command('systemctl is-active ' + ' '.join(shlex.quote(s) for s in services))
+            else:
+                proc = subprocess.run(['systemctl', 'is-active', *services],
+                                      capture_output=True, text=True, timeout=10)
+                out = proc.stdout
+        except Exception:
+            return {service: 'unknown' for service in services}
+        states = (out or '').split()
+        return {service: states[i] if i < len(states) else 'unknown' for i, service in enumerate(services)}
+
+    def _collect_service_status(self):
+        """Build the get_service_status mapping without caching.
+
+        The systemctl query runs on a worker thread while the local process
+        table is scanned, so a slow SSH round trip overlaps with the scan.
+        """
+        systemd = self._services_pool.submit(self._systemd_states, list(self.services))
+        services_status = {}
 
         # Detect local Python processes and include them
         try:
-            services_status_local = {}
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'username']):
-                info = proc.info
-                name = (info.get('name') or '').lower()
-                cmdline = info.get('cmdline') or []
-
-                is_python = False
-                if any(k in name for k in ('python', 'gunicorn', 'uwsgi', 'uvicorn')):
-                    is_python = True
-                else:
-                    for part in cmdline:
-                        try:
-                            if part and 'python' in str(part).lower():
-                                is_python = True
-                                break
-                        except Exception:
-                            continue
-
-                if not is_python:
-                    continue
-
-                # derive a friendly name (script or entry)
-                script = None
-                for part in cmdline:
-                    if part.endswith('.py') or part.endswith(':app'):
-                        script = part
-                        break
-                if not script and len(cmdline) > 0:
-                    # fallback to the process name
-                    script = name or f'python-{info.get("pid")}'
-
-                if script not in services_status_local:
-                    services_status_local[script] = []
-                
-                services_status_local[script].append(info.get('pid'))
+            for script, group in self.processes.python_groups().items():
+                key = f"{script} ({len(group['pids'])} processing)"
                 # mark as active for compatibility with front-end
-            
-            for script, pids in services_status_local.items():
-                key = f"{script} ({len(pids)} processing)"
                 services_status[key] = 'active'
         except Exception:
             # swallow errors during process iteration
             pass
+        services_status = {**systemd.result(), **services_status}
         sorted_by_status = dict(sorted(
             services_status.items(),
             key=lambda x: (x[1] == "active")
         ))
-        return sorted_by_status
-
-    def get_history(self, start_ts=None, end_ts=None):
-        """Return snapshots between start_ts and end_ts.
-        start_ts and end_ts can be datetime objects or timestamps (float) or None.
-        """
-        if not self.history:
-            return []
-        # normalize to floats (epoch)
-        if start_ts is None:
-            start = -float('inf')
-        elif isinstance(start_ts, datetime):
-            start = start_ts.timestamp()
-        else:
-            start = float(start_ts)
-
-        if end_ts is None:
-            end = float('inf')
-        elif isinstance(end_ts, datetime):
-            end = end_ts.timestamp()
-        else:
-            end = float(end_ts)
-
-        result = [s for s in list(self.history) if start <= s['t'] <= end]
-        return result
-
-    # Persistence helpers
-    def _save_snapshot_to_db(self, snapshot):
-        """Insert snapshot into sqlite DB as JSON blob."""
-        if not self._db_conn:
-            return
-        with self._db_lock:
-            cur = self._db_conn.cursor()
-            cur.execute(
-                "INSERT INTO snapshots (ts, t, snapshot) VALUES (?, ?, ?)",
-                (snapshot['ts'], float(snapshot['t']), json.dumps(snapshot))
-            )
-            self._db_conn.commit()
-
-    def _load_history_from_db(self):
-        """Load recent snapshots from DB into memory (respecting max_days)."""
-        if not self._db_conn:
-            return
-        try:
-            cutoff = datetime.utcnow() - timedelta(days=self.max_days)
-            cutoff_ts = cutoff.timestamp()
-            with self._db_lock:
-                cur = self._db_conn.cursor()
-                cur.execute(
-                    "SELECT snapshot FROM snapshots WHERE t >= ? ORDER BY t ASC",
-                    (cutoff_ts,)
-                )
-                rows = cur.fetchall()
-            for (snap_json,) in rows:
-                try:
-                    snap = json.loads(snap_json)
-                    self.history.append(snap)
-                except Exception:
-                    continue
-        except Exception as e:
-            print('DB load error:', e)
-
-    def _cleanup_old_snapshots(self):
-        """Delete snapshots older than retention period from DB."""
-        if not self._db_conn:
-            return
-        try:
-            cutoff = datetime.utcnow() - timedelta(days=self.max_days)
-            cutoff_ts = cutoff.timestamp()
-            with self._db_lock:
-                cur = self._db_conn.cursor()
-                cur.execute("DELETE FROM snapshots WHERE t < ?", (cutoff_ts,))
-                self._db_conn.commit()
-        except Exception as e:
-            print('DB cleanup error:', e)
-
-    def close(self):
-        """Close DB connection if open."""
-        try:
-            if self._db_conn:
-                with self._db_lock:
-                    self._db_conn.close()
-                self._db_conn = None
-        except Exception:
-            pass
-
-    def get_time_series(self, start_ts=None, end_ts=None):
-        """Build time-series arrays for charts between start and end (epoch or datetime).
-        Returns: {labels: [...], cpu: [...], memory: [...], net_rx: [...], net_tx: [...]} where net values are MB/s.
-        """
-        snaps = self.get_history(start_ts, end_ts)
-        if not snaps:
-            return {'labels': [], 'cpu': [], 'memory': [], 'net_rx': [], 'net_tx': []}
-
-        labels = [s['ts'] for s in snaps]
-        cpu = [round(s['cpu']['avg'], 2) for s in snaps]
-        memory = [round(s['memory']['percent'], 2) for s in snaps]
-
-        # compute network rates by differences between consecutive snapshots
-        net_rx = []
-        net_tx = []
-        for i in range(len(snaps)):
-            if i == 0:
-                net_rx.append(0)
-                net_tx.append(0)
-            else:
-                prev = snaps[i-1]
-                cur = snaps[i]
-                dt = cur['t'] - prev['t'] if cur['t'] - prev['t'] > 0 else 1
-                rx_rate = (cur['net']['bytes_recv'] - prev['net']['bytes_recv']) / dt
-                tx_rate = (cur['net']['bytes_sent'] - prev['net']['bytes_sent']) / dt
-                # convert to MB/s
-                net_rx.append(round(rx_rate / (1024*1024), 4))
-                net_tx.append(round(tx_rate / (1024*1024), 4))
-
-        return {'labels': labels, 'cpu': cpu, 'memory': memory, 'net_rx': net_rx, 'net_tx': net_tx}
\ No newline at end of file
+        return sorted_by_status
\ No newline at end of file
@@ -0,0 +1,122 @@
+import heapq
+import threading
+import time
+
+import psutil
+
+PYTHON_RUNNERS = ('python', 'gunicorn', 'uwsgi', 'uvicorn')
+
+
+def _python_script(name, cmdline, pid):
+    """Return (is_python, friendly script name) for a process.
+
+    Same rules the services page has always used: a Python runner in the
+    process name or 'python' anywhere in the command line, named after the
+    first `*.py` / `*:app` argument.
+    """
+    is_python = any(k in name for k in PYTHON_RUNNERS)
+    if not is_python:
+        is_python = any(part and 'python' in str(part).lower() for part in cmdline)
+    if not is_python:
+        return False, None
+    for part in cmdline:
+        if part.endswith('.py') or part.endswith(':app'):
+            return True, part
+    if cmdline:
+        # fallback to the process name
+        return True, name or f'python-{pid}'
+    return True, None
+
+
+class ProcessTracker:
+    """Incremental view of the process table.
+
+    Static attributes (name, cmdline, user, Python script) are read once per
+    process, keyed by (pid, create_time) so a reused PID is treated as a new
+    process. Each refresh only reads the cheap counters (CPU times, RSS) and
+    picks up births and deaths; psutil.process_iter keeps the Process objects
+    between calls, which is also what lets cpu_percent() measure a delta.
+    """
+
+    def __init__(self, max_age=5):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._static = {}
+        self._rows = []
+        self._refreshed = None
+
+    def refresh(self):
+        """Rescan the process table and return the list of process rows."""
+        rows = []
+        alive = set()
+        for proc in psutil.process_iter():
+            try:
+                with proc.oneshot():
+                    key = (proc.pid, proc.create_time())
+                    static = self._static.get(key)
+                    if static is None:
+                        static = self._read_static(proc)
+                        self._static[key] = static
+                    cpu = proc.cpu_percent(None)
+                    rss = proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            alive.add(key)
+            rows.append(dict(static, pid=proc.pid, cpu_percent=cpu, rss=rss))
+        # forget processes that exited
+        for key in [k for k in self._static if k not in alive]:
+            del self._static[key]
+        return rows
+
+    @staticmethod
+    def _read_static(proc):
+        name = proc.name() or ''
+        try:
+            cmdline = proc.cmdline() or []
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            cmdline = []
+        try:
+            user = proc.username()
+        except (psutil.AccessDenied, KeyError):
+            user = None
+        is_python, script = _python_script(name.lower(), cmdline, proc.pid)
+        return {
+            'name': name,
+            'cmdline': ' '.join(cmdline),
+            'user': user,
+            'is_python': is_python,
+            'python_script': script,
+        }
+
+    def rows(self):
+        """Process rows, rescanning at most once every max_age seconds."""
+        with self._lock:
+            if self._refreshed is None or time.monotonic() - self._refreshed >= self.max_age:
+                self._rows = self.refresh()
+                self._refreshed = time.monotonic()
+            return self._rows
+
+    def python_groups(self):
+        """Python processes grouped by script: {script: {'pids', 'cpu_percent', 'rss'}}."""
+        groups = {}
+        for row in self.rows():
+            if not row['is_python']:
+                continue
+            g = groups.setdefault(row['python_script'], {'pids': [], 'cpu_percent': 0.0, 'rss': 0})
+            g['pids'].append(row['pid'])
+            g['cpu_percent'] += row['cpu_percent']
+            g['rss'] += row['rss']
+        return groups
+
+    def summary(self, n=10):
+        """Top-n processes by CPU and by RSS plus the Python worker groups."""
+        rows = self.rows()
+        return {
+            'count': len(rows),
+            'top_cpu': heapq.nlargest(n, rows, key=lambda r: r['cpu_percent']),
+            'top_memory': heapq.nlargest(n, rows, key=lambda r: r['rss']),
+            'python': [
+                dict(group, script=script, count=len(group['pids']))
+                for script, group in sorted(self.python_groups().items(), key=lambda kv: str(kv[0]))
+            ],
+        }
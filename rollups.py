@@ -0,0 +1,236 @@
+import math
+import threading
+from bisect import bisect_left, bisect_right
+
+from history_store import _TimeIndex, _zeros
+
+# (name, bucket seconds), finest first
+TIERS = (('1m', 60), ('5m', 300), ('1h', 3600))
+METRICS = ('cpu', 'memory', 'net_rx', 'net_tx')
+STATS = ('min', 'avg', 'max')
+COLUMNS = tuple(f'{m}_{s}' for m in METRICS for s in STATS)
+
+
+class RollupTier:
+    """Ring buffer of closed min/avg/max buckets for one resolution.
+
+    Samples are folded into an open bucket; the bucket is closed (and
+    returned to the caller for persistence) when the first sample of the
+    next bucket arrives.
+    """
+
+    def __init__(self, name, seconds, maxlen):
+        self.name = name
+        self.seconds = seconds
+        self.maxlen = max(1, int(maxlen))
+        self._lock = threading.Lock()
+        self._start = 0
+        self._count = 0
+        self._index = _TimeIndex(self)
+        self._t = _zeros('d', self.maxlen)
+        self._cols = {c: _zeros('f', self.maxlen) for c in COLUMNS}
+        # [bucket_start, {metric: [count, sum, min, max]}]
+        self._open = None
+
+    def __len__(self):
+        return self._count
+
+    def _phys(self, index):
+        return (self._start + index) % self.maxlen
+
+    def last_closed(self):
+        """Start time of the newest closed bucket, or None."""
+        with self._lock:
+            if not self._count:
+                return None
+            return self._t[self._phys(self._count - 1)]
+
+    def add(self, t, values):
+        """Fold one sample into the open bucket.
+
+        Returns the row of the bucket this sample closed, or None. Samples
+        falling into an already closed bucket are ignored, which makes it safe
+        to replay raw history over rollups loaded from the DB.
+        """
+        start = t - t % self.seconds
+        last = self.last_closed()
+        if last is not None and start <= last:
+            return None
+        if self._open is not None and start < self._open[0]:
+            return None
+
+        closed = None
+        if self._open is not None and start != self._open[0]:
+            closed = self._close()
+        if self._open is None:
+            self._open = [start, {}]
+
+        acc = self._open[1]
+        for metric, v in values.items():
+            if v is None:
+                continue
+            a = acc.get(metric)
+            if a is None:
+                acc[metric] = [1, v, v, v]
+            else:
+                a[0] += 1
+                a[1] += v
+                if v < a[2]:
+                    a[2] = v
+                if v > a[3]:
+                    a[3] = v
+        return closed
+
+    def _close(self):
+        start, acc = self._open
+        self._open = None
+        row = {'t': start}
+        for metric in METRICS:
+            a = acc.get(metric)
+            row[f'{metric}_min'] = a[2] if a else None
+            row[f'{metric}_avg'] = a[1] / a[0] if a else None
+            row[f'{metric}_max'] = a[3] if a else None
+        self.push(row)
+        return row
+
+    def push(self, row):
+        """Append a closed bucket row (also used when loading from the DB)."""
+        with self._lock:
+            if self._count < self.maxlen:
+                p = self._phys(self._count)
+                self._count += 1
+            else:
+                p = self._start
+                self._start = (self._start + 1) % self.maxlen
+            self._t[p] = float(row['t'])
+            for c in COLUMNS:
+                v = row.get(c)
+                self._cols[c][p] = math.nan if v is None else float(v)
+
+    def _slice(self, column, lo, hi):
+        """Copy logical rows [lo, hi) out of a column, handling wrap-around."""
+        if lo >= hi:
+            return column[0:0]
+        a = self._phys(lo)
+        b = self._phys(hi - 1) + 1
+        if a < b:
+            return column[a:b]
+        return column[a:] + column[:b]
+
+    def columns(self, start, end):
+        """Return {'t': array, <column>: array} slices for buckets with start <= t <= end.
+
+        Only the matching rows are copied; missing values are NaN.
+        """
+        with self._lock:
+            lo = bisect_left(self._index, start)
+            hi = bisect_right(self._index, end, lo)
+            out = {'t': self._slice(self._t, lo, hi)}
+            for c in COLUMNS:
+                out[c] = self._slice(self._cols[c], lo, hi)
+            return out
+
+
+class Rollups:
+    """Maintain all rollup tiers from the raw sample stream."""
+
+    def __init__(self, max_days):
+        self.tiers = {
+            name: RollupTier(name, seconds, int(max_days * 86400 / seconds) + 1)
+            for name, seconds in TIERS
+        }
+        self._prev = None
+
+    def add(self, snapshot):
+        """Feed one raw snapshot to every tier.
+
+        Network rates (MB/s) are derived from the previous snapshot; a counter
+        going backwards (reboot, wrap) yields no rate for that sample.
+        Returns a list of (tier_name, row) for buckets closed by this sample.
+        """
+        t = float(snapshot['t'])
+        net = snapshot.get('net') or {}
+        recv = net.get('bytes_recv')
+        sent = net.get('bytes_sent')
+        rx = tx = None
+        if self._prev is not None and recv is not None and sent is not None:
+            pt, precv, psent = self._prev
+            dt = t - pt
+            if dt > 0 and recv >= precv and sent >= psent:
+                rx = (recv - precv) / dt / (1024*1024)
+                tx = (sent - psent) / dt / (1024*1024)
+        if recv is not None and sent is not None:
+            self._prev = (t, recv, sent)
+
+        values = {
+            'cpu': (snapshot.get('cpu') or {}).get('avg'),
+            'memory': (snapshot.get('memory') or {}).get('percent'),
+            'net_rx': rx,
+            'net_tx': tx,
+        }
+        closed = []
+        for name, tier in self.tiers.items():
+            row = tier.add(t, values)
+            if row is not None:
+                closed.append((name, row))
+        return closed
+
+    def choose(self, start, end, max_points, min_seconds=0):
+        """Pick the coarsest tier whose bucket is no wider than (end - start) / max_points.
+
+        Tiers with buckets shorter than min_seconds are never picked: callers
+        pass a few raw sample intervals, since a tier that barely reduces the
+        row count is slower than downsampling the raw samples.
+        Returns a tier name, or None when raw samples are needed.
+        """
+        if not max_points or max_points <= 0 or end <= start:
+            return None
+        step = (end - start) / max_points
+        chosen = None
+        for name, seconds in TIERS:
+            if min_seconds <= seconds <= step:
+                chosen = name
+        return chosen
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most `threshold` points of (x, y) that best
+    preserve the visual shape of the series. None values in y count as 0.
+    Below 3 points there is nothing to choose: 2 keeps the first and last
+    point, 1 only the last.
+    """
+    n = len(x)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1] if threshold == 2 else [n - 1]
+    y = [v if v is not None else 0.0 for v in y]
+
+    indices = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average point of the next bucket
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        span = avg_end - avg_start
+        avg_x = sum(x[avg_start:avg_end]) / span
+        avg_y = sum(y[avg_start:avg_end]) / span
+
+        # pick the point in this bucket forming the largest triangle with a and the average
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = x[a], y[a]
+        best = range_start
+        best_area = -1.0
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        indices.append(best)
+        a = best
+    indices.append(n - 1)
+    return indices
@@ -0,0 +1,59 @@
+"""Standalone sampler process for multi-worker deployments.
+
+Samples the local host, writes the SQLite history and publishes the latest
+stats plus a window of recent snapshots to a shared-memory segment. Run one
+of these next to any number of web workers started with MONITOR_ROLE=replica.
+
+Environment: MONITOR_DB (default monitor.db), MONITOR_SHM (default
+/dev/shm/system-monitor), MONITOR_INTERVAL (seconds, default 60),
+MONITOR_ALERTS (alert rules and notifiers, see alerts.load_alerts),
+MONITOR_BURST (0 turns off adaptive burst sampling), MONITOR_SKIP_NICS
+(comma-separated interface prefixes without per-device rates), MONITOR_FLEET and
+MONITOR_FLEET_DIR (fleet mode: this process polls the hosts, replicas only
+read their files).
+"""
+import os
+import signal
+import sys
+import time
+
+from alerts import load_alerts
+from monitor import SystemMonitor
+
+
+def main():
+    monitor = SystemMonitor(
+        sample_interval=int(os.environ.get('MONITOR_INTERVAL', 60)),
+        storage_path=os.environ.get('MONITOR_DB', 'monitor.db'),
+        role='sampler',
+        shm_path=os.environ.get('MONITOR_SHM'),
+        burst_sampling=os.environ.get('MONITOR_BURST', '1') != '0',
+        alerts=load_alerts(os.environ['MONITOR_ALERTS']) if os.environ.get('MONITOR_ALERTS') else None,
+        skip_nics=[s.strip() for s in os.environ['MONITOR_SKIP_NICS'].split(',') if s.strip()]
+        if os.environ.get('MONITOR_SKIP_NICS') else None
+    )
+    fleet = None
+    if os.environ.get('MONITOR_FLEET'):
+        from fleet import FleetCollector, load_hosts
+        fleet = FleetCollector(
+            load_hosts(os.environ['MONITOR_FLEET']),
+            storage_dir=os.environ.get('MONITOR_FLEET_DIR', 'fleet'),
+            role='sampler'
+        )
+
+    def stop(signum, frame):
+        # flush buffered samples before exiting
+        monitor.close()
+        if fleet:
+            for store in fleet.stores.values():
+                store.close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == '__main__':
+    main()
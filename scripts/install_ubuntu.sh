@@ -43,7 +43,7 @@ if [ -f "$REQ_FILE" ]; then
   "$DEST_DIR/venv/bin/pip" install -r "$REQ_FILE"
 else
   # Fallback minimal deps
-  "$DEST_DIR/venv/bin/pip" install flask psutil paramiko
+  "$DEST_DIR/venv/bin/pip" install flask psutil paramiko numpy
 fi
 
 # Create systemd unit file
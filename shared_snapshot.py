@@ -0,0 +1,104 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+# Shared segment layout: a fixed 64-byte header followed by a JSON payload.
+#   magic (8s) | version (I) | capacity (I) | seq (Q) | length (I)
+# `seq` is a seqlock counter: odd while the writer is updating the payload,
+# even when it is consistent. Readers retry until they see the same even
+# value before and after copying the payload.
+MAGIC = b'SYSMON\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQI')
+SEQ_OFFSET = 16
+LENGTH_OFFSET = 24
+DATA_OFFSET = 64
+DEFAULT_PATH = '/dev/shm/system-monitor'
+DEFAULT_SIZE = 4 * 1024 * 1024
+
+
+class SharedSnapshotWriter:
+    """Single writer of the shared segment (the sampler process)."""
+
+    def __init__(self, path=DEFAULT_PATH, size=DEFAULT_SIZE):
+        self.path = path
+        self.capacity = size - DATA_OFFSET
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self._seq = 0
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.capacity, self._seq, 0)
+
+    def publish(self, stats, snapshots):
+        """Publish the latest stats and a window of recent snapshots (oldest first).
+
+        The oldest snapshots are dropped if the payload would not fit.
+        """
+        snapshots = list(snapshots)
+        while True:
+            data = json.dumps({'stats': stats, 'snapshots': snapshots}).encode()
+            if len(data) <= self.capacity or not snapshots:
+                break
+            snapshots = snapshots[len(snapshots) // 4 + 1:]
+        if len(data) > self.capacity:
+            return False
+
+        self._seq += 1
+        struct.pack_into('<Q', self._mm, SEQ_OFFSET, self._seq)
+        self._mm[DATA_OFFSET:DATA_OFFSET + len(data)] = data
+        struct.pack_into('<I', self._mm, LENGTH_OFFSET, len(data))
+        self._seq += 1
+        struct.pack_into('<Q', self._mm, SEQ_OFFSET, self._seq)
+        return True
+
+    def close(self):
+        self._mm.close()
+
+
+class SharedSnapshotReader:
+    """Read-only view of the shared segment (web workers)."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._mm = None
+
+    def _map(self):
+        if self._mm is None:
+            with open(self.path, 'rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version = HEADER.unpack_from(self._mm, 0)[:2]
+            if magic != MAGIC or version != VERSION:
+                self._mm.close()
+                self._mm = None
+                raise ValueError(f'{self.path} is not a system monitor segment')
+        return self._mm
+
+    def sequence(self):
+        """Current seqlock counter; cheap way to detect a new publish."""
+        return struct.unpack_from('<Q', self._map(), SEQ_OFFSET)[0]
+
+    def read(self, retries=100):
+        """Return (seq, payload dict), or None if no consistent copy could be taken."""
+        mm = self._map()
+        for _ in range(retries):
+            seq = struct.unpack_from('<Q', mm, SEQ_OFFSET)[0]
+            if seq % 2:
+                time.sleep(0)
+                continue
+            length = struct.unpack_from('<I', mm, LENGTH_OFFSET)[0]
+            data = mm[DATA_OFFSET:DATA_OFFSET + length]
+            if struct.unpack_from('<Q', mm, SEQ_OFFSET)[0] == seq:
+                if not length:
+                    return seq, None
+                return seq, json.loads(data)
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
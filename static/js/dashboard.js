@@ -3,6 +3,14 @@ let cpuChart, memoryChart, networkChart;
 let loadLeftChart, loadRightChart, overviewChart;
 let loadStatusChart, cpuStatusChart, ramStatusChart, diskStatusChart;
 let range = 'today';
+// Upper bound on points per series; the server picks a rollup tier and downsamples to fit
+const MAX_POINTS = 720;
+// cursor and resolution of the last full history load, for incremental refreshes
+let historyCursor = null;
+let historyResolution = null;
+// true while the charts hold every raw sample of the range, so streamed samples can be appended
+let historyLive = false;
+let historyLoadedAt = 0;
 // Options for doughnut charts (status)
 const doughnutOptions = {
     responsive: true,
@@ -67,7 +75,8 @@ function formatDateLabel(date, mode){
 
 function formatLabels(rawLabels){
     if(!rawLabels || rawLabels.length === 0) return [];
-    const dates = rawLabels.map(s => new Date(s));
+    // ISO strings (JSON) or epoch milliseconds (binary, Float64Array)
+    const dates = Array.from(rawLabels, s => new Date(s));
     const span = dates[dates.length-1] - dates[0];
     const oneDay = 24 * 3600 * 1000;
     let mode = 'date';
@@ -217,15 +226,54 @@ function renderDisk(data) {
     }
 }
 
+// Decode the compact /history encoding (see compact.py). Columns are read as typed
+// arrays but returned as plain arrays (None values as null) because the charts push
+// and concat onto them; labels are epoch milliseconds.
+function decodeSeries(buf) {
+    const view = new DataView(buf);
+    const headLen = view.getUint32(4, true);
+    const head = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 8, headLen)));
+    const n = head.n;
+    let offset = 8 + headLen;
+    const labels = new Array(n);
+    if (head.step !== null) {
+        for (let i = 0; i < n; i++) labels[i] = head.base + head.step * i;
+    } else {
+        const deltas = new Int32Array(buf, offset, n);
+        for (let i = 0; i < n; i++) labels[i] = head.base + deltas[i] * head.unit;
+        offset += 4 * n;
+    }
+    const data = { ...head, labels };
+    head.columns.forEach(name => {
+        // float32 -> the 2-4 decimals the server rounded to
+        data[name] = Array.from(new Float32Array(buf, offset, n), v => (Number.isNaN(v) ? null : Math.round(v * 1e4) / 1e4));
+        offset += 4 * n;
+    });
+    return data;
+}
+
+// GET a /history URL in the compact binary format, falling back to JSON
+async function loadSeries(url) {
+    const resp = await fetch(url, { headers: { 'Accept': 'application/vnd.sysmon.series, application/json;q=0.5' } });
+    if ((resp.headers.get('Content-Type') || '').startsWith('application/vnd.sysmon.series')) {
+        return decodeSeries(await resp.arrayBuffer());
+    }
+    return resp.json();
+}
+
 // Fetch history and update charts
 async function fetchHistory(params = {}) {
     let url = '/history';
     if (params.range) url += `?range=${encodeURIComponent(params.range)}`;
     if (params.start && params.end) url += `?start=${encodeURIComponent(params.start)}&end=${encodeURIComponent(params.end)}`;
+    url += `${url.includes('?') ? '&' : '?'}max_points=${MAX_POINTS}`;
 
     try {
-        const resp = await fetch(url);
-        const data = await resp.json();
+        const data = await loadSeries(url);
+        historyCursor = data.cursor;
+        historyResolution = data.resolution;
+        historyLive = data.resolution === 'raw' && data.labels.length < MAX_POINTS;
+        historyLoadedAt = Date.now();
         // labels: ISO timestamps
     const labels = formatLabels(data.labels);
 
@@ -277,6 +325,88 @@ async function fetchHistory(params = {}) {
     } catch (err) {
         console.error('fetchHistory error', err);
     }
+    fetchHeatmap(params);
+}
+
+// Heatmap colour for a utilization percent: light grey -> blue -> red
+function heatColor(v) {
+    const stops = [[0, [237, 241, 245]], [50, [52, 152, 219]], [100, [231, 76, 60]]];
+    const i = v <= 50 ? 0 : 1;
+    const [p0, c0] = stops[i], [p1, c1] = stops[i + 1];
+    const f = (Math.min(100, Math.max(0, v)) - p0) / (p1 - p0);
+    return c0.map((c, k) => Math.round(c + (c1[k] - c) * f));
+}
+
+// Draw /history/percpu: one column per time bucket, one row per core (core 0 on top)
+function drawHeatmap(canvas, data) {
+    const cols = data.values.length, rows = data.cores;
+    const ctx = canvas.getContext('2d');
+    canvas.width = canvas.clientWidth;
+    canvas.height = canvas.clientHeight;
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    canvas._heatmap = data;
+    if (!cols || !rows) return;
+    const cells = document.createElement('canvas');
+    cells.width = cols;
+    cells.height = rows;
+    const cellCtx = cells.getContext('2d');
+    const img = cellCtx.createImageData(cols, rows);
+    data.values.forEach((column, x) => {
+        column.forEach((v, y) => {
+            const [r, g, b] = heatColor(v);
+            const o = (y * cols + x) * 4;
+            img.data[o] = r; img.data[o + 1] = g; img.data[o + 2] = b; img.data[o + 3] = 255;
+        });
+    });
+    cellCtx.putImageData(img, 0, 0);
+    ctx.imageSmoothingEnabled = false;
+    ctx.drawImage(cells, 0, 0, canvas.width, canvas.height);
+}
+
+// Show the time, core and value under the pointer as the canvas tooltip
+function heatmapTooltip(ev) {
+    const canvas = ev.target, data = canvas._heatmap;
+    if (!data || !data.values.length) return;
+    const x = Math.floor(ev.offsetX / canvas.clientWidth * data.values.length);
+    const y = Math.floor(ev.offsetY / canvas.clientHeight * data.cores);
+    const column = data.values[x];
+    if (!column || column[y] === undefined) return;
+    const d = new Date(data.labels[x]);
+    canvas.title = `${formatDateLabel(d, 'datetime')}  core ${y}: ${column[y]}% (${data.agg})`;
+}
+
+async function fetchHeatmap(params = {}) {
+    const canvas = document.getElementById('cpuHeatmap');
+    if (!canvas) return;
+    let url = '/history/percpu';
+    if (params.start && params.end) url += `?start=${encodeURIComponent(params.start)}&end=${encodeURIComponent(params.end)}`;
+    else url += `?range=${encodeURIComponent(params.range || 'today')}`;
+    // one bucket per pixel column
+    url += `&columns=${Math.max(1, canvas.clientWidth)}`;
+    try {
+        const resp = await fetch(url);
+        if (!resp.ok) return;
+        drawHeatmap(canvas, await resp.json());
+    } catch (err) {
+        console.error('fetchHeatmap error', err);
+    }
+}
+
+// Fetch only the points newer than the last load and append them
+async function fetchHistoryDelta() {
+    if (historyCursor === null || historyCursor === undefined) return fetchHistory({ range: range });
+    const url = `/history?range=${encodeURIComponent(range)}&since=${historyCursor}` +
+        `&resolution=${encodeURIComponent(historyResolution || 'raw')}`;
+    try {
+        const resp = await fetch(url);
+        const data = await resp.json();
+        if (data.cursor !== null && data.cursor !== undefined) historyCursor = data.cursor;
+        data.labels.forEach((ts, i) => appendPoint({
+            ts, cpu: data.cpu[i], memory: data.memory[i], net_rx: data.net_rx[i], net_tx: data.net_tx[i]
+        }));
+    } catch (err) {
+        console.error('fetchHistoryDelta error', err);
+    }
 }
 
 // Fetch history for a specific target (card)
@@ -288,9 +418,9 @@ async function fetchHistoryFor(range, target, startIso = null, endIso = null) {
     } else {
         url = `/history?range=${encodeURIComponent(range)}`;
     }
+    url += `&max_points=${MAX_POINTS}`;
     try {
-        const resp = await fetch(url);
-        const data = await resp.json();
+        const data = await loadSeries(url);
         const labels = formatLabels(data.labels);
 
         if (target === 'cpu' && cpuChart) {
@@ -320,7 +450,15 @@ async function fetchLatestStats() {
     try {
         const r = await fetch('/stats');
         const d = await r.json();
+        renderStats(d);
+    } catch (e) {
+        console.error('fetchLatestStats error', e);
+    }
+}
 
+// Update status cards and disk list from a /stats payload
+function renderStats(d) {
+    try {
         // Update system health status chart
         if (loadStatusChart && d.cpu) {
             console.log('Updating load status chart with CPU avg:', d.cpu);
@@ -366,10 +504,67 @@ async function fetchLatestStats() {
 
         renderDisk(d.disk);
     } catch (e) {
-        console.error('fetchLatestStats error', e);
+        console.error('renderStats error', e);
+    }
+}
+
+// Append one streamed sample to a line chart without replacing its datasets
+function pushPoint(chart, label, values) {
+    if (!chart) return;
+    chart.data.labels.push(label);
+    values.forEach((v, i) => chart.data.datasets[i].data.push(v));
+    // keep a long-lived tab bounded
+    const extra = chart.data.labels.length - MAX_POINTS;
+    if (extra > 0) {
+        chart.data.labels.splice(0, extra);
+        chart.data.datasets.forEach(ds => ds.data.splice(0, extra));
+    }
+    chart.update('none');
+}
+
+function appendPoint(p) {
+    const label = formatDateLabel(new Date(p.ts), 'time');
+    pushPoint(cpuChart, label, [p.cpu]);
+    pushPoint(memoryChart, label, [p.memory]);
+    pushPoint(networkChart, label, [p.net_rx, p.net_tx]);
+    pushPoint(loadLeftChart, label, [p.cpu]);
+    pushPoint(overviewChart, label, [p.cpu]);
+    if (loadRightChart) {
+        const cpu = loadRightChart.data.datasets[0].data.concat([p.cpu]).map(Number);
+        const mean = n => { const s = cpu.slice(-n); return (s.reduce((a,b)=>a+b,0)/s.length).toFixed(2); };
+        pushPoint(loadRightChart, label, [p.cpu, mean(5), mean(15)]);
+    }
+}
+
+// Show a streamed sample: appended while the charts hold raw samples; rollup or
+// downsampled series are reloaded at most once a minute instead of mixing resolutions
+function liveUpdate(p) {
+    if (historyLive && cpuChart && cpuChart.data.labels.length < MAX_POINTS) {
+        appendPoint(p);
+    } else if (Date.now() - historyLoadedAt >= 60000) {
+        historyLoadedAt = Date.now();
+        fetchHistory({ range: range });
     }
 }
 
+// Subscribe to live samples; returns false when SSE is unavailable
+function startStream() {
+    if (!window.EventSource) return false;
+    const source = new EventSource('/stream');
+    source.addEventListener('sample', (ev) => {
+        try {
+            const p = JSON.parse(ev.data);
+            if (p.stats) renderStats(p.stats);
+            if (range === 'today') liveUpdate(p);
+        } catch (e) {
+            console.error('stream event error', e);
+        }
+    });
+    // the browser reconnects on its own and resumes via Last-Event-ID
+    source.onerror = () => console.warn('stream disconnected, retrying');
+    return true;
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     // Initialize all charts
     initializeCharts();
@@ -438,14 +633,22 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // initial load: Today by default
     fetchHistory({ range: range });
-
-    // refresh periodically (refresh history for 'today')
-    setInterval(() => {
-    if (range === 'today') {
-            fetchHistory({ range: range })
-        }
-    }, 60000);
     fetchLatestStats()
-    // refresh services/disk in background more often
-    setInterval(fetchLatestStats, 5000);
+
+    const heatmapCanvas = document.getElementById('cpuHeatmap');
+    if (heatmapCanvas) heatmapCanvas.addEventListener('mousemove', heatmapTooltip);
+    // the heatmap is not streamed: redraw it every minute for today
+    setInterval(() => { if (range === 'today') fetchHeatmap({ range: range }); }, 60000);
+
+    // live samples are pushed over SSE; fall back to polling without it
+    if (!startStream()) {
+        // refresh periodically (refresh history for 'today')
+        setInterval(() => {
+        if (range === 'today') {
+                fetchHistoryDelta()
+            }
+        }, 60000);
+        // refresh services/disk in background more often
+        setInterval(fetchLatestStats, 5000);
+    }
 });
\ No newline at end of file
@@ -0,0 +1,608 @@
+import calendar
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from devices import KINDS as DEVICE_KINDS
+from history_store import quantize_percent
+from instrument import DB_FLUSH_SECONDS, DB_LOCK_WAIT_SECONDS, DB_ROWS, TimedLock
+from rollups import COLUMNS as ROLLUP_COLUMNS
+
+DAY = 86400
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS mounts (
+        id INTEGER PRIMARY KEY,
+        mountpoint TEXT NOT NULL UNIQUE,
+        device TEXT,
+        fstype TEXT
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS rollups (
+        tier TEXT NOT NULL,
+        t REAL NOT NULL,
+        {', '.join(c + ' REAL' for c in ROLLUP_COLUMNS)},
+        PRIMARY KEY (tier, t)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS burst (
+        t REAL PRIMARY KEY,
+        cpu REAL,
+        memory REAL,
+        net_rx REAL,
+        net_tx REAL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS devices (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE (kind, name)
+    )
+    """,
+)
+BURST_COLUMNS = ('t', 'cpu', 'memory', 'net_rx', 'net_tx')
+
+# Raw samples are stored in one set of these tables per day, e.g. samples_20240131.
+# {p} is replaced by the partition suffix.
+PARTITION_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS samples{p} (
+        t REAL PRIMARY KEY,
+        cpu_avg REAL,
+        cpu_freq REAL,
+        freq_min REAL,
+        freq_max REAL,
+        cores INTEGER,
+        logical_cores INTEGER,
+        mem_total INTEGER,
+        mem_available INTEGER,
+        mem_used INTEGER,
+        mem_percent REAL,
+        bytes_sent INTEGER,
+        bytes_recv INTEGER
+    ) WITHOUT ROWID
+    """,
+    # per-core utilization: one byte per core (whole percent), see history_store.quantize_percent
+    """
+    CREATE TABLE IF NOT EXISTS sample_percpu{p} (
+        t REAL PRIMARY KEY,
+        percpu BLOB
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sample_disk{p} (
+        t REAL NOT NULL,
+        mount_id INTEGER NOT NULL REFERENCES mounts(id),
+        total INTEGER,
+        used INTEGER,
+        free INTEGER,
+        PRIMARY KEY (t, mount_id)
+    ) WITHOUT ROWID
+    """,
+    # per-device rates; m0..m5 are the metrics of the device's kind, in devices.KINDS order
+    """
+    CREATE TABLE IF NOT EXISTS sample_dev{p} (
+        dev_id INTEGER NOT NULL REFERENCES devices(id),
+        t REAL NOT NULL,
+        m0 REAL, m1 REAL, m2 REAL, m3 REAL, m4 REAL, m5 REAL,
+        PRIMARY KEY (dev_id, t)
+    ) WITHOUT ROWID
+    """,
+)
+PARTITIONED = ('samples', 'sample_percpu', 'sample_disk', 'sample_dev')
+DEVICE_COLUMNS = ('m0', 'm1', 'm2', 'm3', 'm4', 'm5')
+
+SAMPLE_COLUMNS = (
+    't', 'cpu_avg', 'cpu_freq', 'freq_min', 'freq_max', 'cores', 'logical_cores',
+    'mem_total', 'mem_available', 'mem_used', 'mem_percent', 'bytes_sent', 'bytes_recv'
+)
+
+
+def _suffix(day):
+    """Table name suffix of a partition: `_YYYYMMDD` of the day number."""
+    return time.strftime('_%Y%m%d', time.gmtime(day * DAY))
+
+
+def _day_of_table(name):
+    """Day number of a partition table name, or None for other tables."""
+    base, _, date = name.rpartition('_')
+    if base not in PARTITIONED or len(date) != 8 or not date.isdigit():
+        return None
+    return calendar.timegm(time.strptime(date, '%Y%m%d')) // DAY
+
+
+class SampleDB:
+    """SQLite persistence for samples and rollups.
+
+    Scalar metrics live in typed columns of `samples`; per-CPU values are
+    packed one byte per core into `sample_percpu`, per-mount values go to the
+    `sample_disk` child table and per-device
+    disk / network rates to `sample_dev` (devices listed in `devices`). The database
+    runs in WAL mode with synchronous=NORMAL, and samples are buffered in
+    memory and written in one transaction every `flush_interval` seconds or
+    `flush_batch` samples, whichever comes first.
+
+    Raw sample tables are partitioned by day (`samples_YYYYMMDD`, ...), so
+    retention drops whole tables instead of deleting rows. The file uses
+    incremental auto-vacuum and the freed pages are returned to the OS after
+    each drop, which keeps its size bounded by the retention period.
+
+    The legacy `snapshots` table (one JSON blob per sample) is migrated on
+    open, in chunks.
+
+    With read_only=True the file is opened read-only (no schema changes,
+    no migration); used by web workers while a separate sampler writes.
+    """
+
+    def __init__(self, path, flush_interval=30, flush_batch=100, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        # records how long readers and writers wait for each other
+        self._db_lock = TimedLock(DB_LOCK_WAIT_SECONDS)
+        # the sampler only takes this one to queue a sample, never the DB lock
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._mount_ids = {}
+        self._device_ids = {}
+        # day numbers of the existing partitions
+        self._days = set()
+
+        if read_only:
+            self._db_conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False, timeout=30)
+            return
+
+        # ensure directory exists
+        db_dir = os.path.dirname(os.path.abspath(path))
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        # connect with check_same_thread False to allow access from sampler thread
+        self._db_conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # only takes effect on a new file; in older files the pages freed by retention are reused instead
+        self._db_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db_conn.execute("PRAGMA journal_mode=WAL")
+        self._db_conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in SCHEMA:
+            self._db_conn.execute(ddl)
+        self._db_conn.commit()
+        for mount_id, mountpoint in self._db_conn.execute("SELECT id, mountpoint FROM mounts"):
+            self._mount_ids[mountpoint] = mount_id
+        for dev_id, kind, name in self._db_conn.execute("SELECT id, kind, name FROM devices"):
+            self._device_ids[(kind, name)] = dev_id
+        self._load_partitions()
+        # partitions created before a table was added to PARTITION_SCHEMA
+        with self._db_conn:
+            for day in self._days:
+                for ddl in PARTITION_SCHEMA:
+                    self._db_conn.execute(ddl.format(p=_suffix(day)))
+        self._migrate_snapshots()
+
+    # Writes
+    def save(self, snapshot):
+        """Buffer a snapshot; flush when the batch is full or the cadence elapsed."""
+        with self._pending_lock:
+            self._pending.append(snapshot)
+        if (len(self._pending) >= self.flush_batch
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered snapshots in a single transaction."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        with self._db_lock:
+            with DB_FLUSH_SECONDS.time():
+                with self._db_conn:
+                    self._insert(pending)
+        DB_ROWS.inc(amount=len(pending))
+
+    # Partitions
+    def _load_partitions(self):
+        """Refresh the set of partition days from the schema."""
+        days = set()
+        for (name,) in self._db_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+            day = _day_of_table(name)
+            if day is not None:
+                days.add(day)
+        self._days = days
+
+    def _partition(self, day):
+        """Create the tables of a day partition if needed. Caller holds the lock."""
+        if day not in self._days:
+            for ddl in PARTITION_SCHEMA:
+                self._db_conn.execute(ddl.format(p=_suffix(day)))
+            self._days.add(day)
+        return _suffix(day)
+
+    def _partitions(self, start_ts, end_ts):
+        """Suffixes of the partitions overlapping [start_ts, end_ts], oldest first. Caller holds the lock."""
+        if self.read_only:
+            # the writer creates and drops partitions behind our back
+            self._load_partitions()
+        return [_suffix(d) for d in sorted(self._days) if (d + 1) * DAY > start_ts and d * DAY <= end_ts]
+
+    def partitions(self):
+        """[(day start timestamp, table suffix)] of the existing partitions, oldest first."""
+        with self._db_lock:
+            return [(d * DAY, _suffix(d)) for d in sorted(self._days)]
+
+    def _mount_id(self, mountpoint, info):
+        """Return the id of a mountpoint, registering it on first sight. Caller holds the lock."""
+        mount_id = self._mount_ids.get(mountpoint)
+        if mount_id is None:
+            cur = self._db_conn.execute(
+                "INSERT INTO mounts (mountpoint, device, fstype) VALUES (?, ?, ?)",
+                (mountpoint, info.get('device'), info.get('fstype'))
+            )
+            mount_id = cur.lastrowid
+            self._mount_ids[mountpoint] = mount_id
+        return mount_id
+
+    def _device_id(self, kind, name):
+        """Return the id of a (kind, device), registering it on first sight. Caller holds the lock."""
+        dev_id = self._device_ids.get((kind, name))
+        if dev_id is None:
+            cur = self._db_conn.execute("INSERT INTO devices (kind, name) VALUES (?, ?)", (kind, name))
+            dev_id = cur.lastrowid
+            self._device_ids[(kind, name)] = dev_id
+        return dev_id
+
+    def _insert(self, snapshots):
+        """Insert snapshot dicts into their day partitions. Caller holds the lock and the transaction."""
+        by_day = {}
+        for s in snapshots:
+            t = float(s['t'])
+            samples, cpus, disks, devs = by_day.setdefault(int(t // DAY), ([], [], [], []))
+            cpu = s.get('cpu') or {}
+            freq = cpu.get('frequency') or {}
+            mem = s.get('memory') or {}
+            net = s.get('net') or {}
+            samples.append((
+                t, cpu.get('avg'), freq.get('current'), freq.get('min'), freq.get('max'),
+                cpu.get('cores'), cpu.get('logical_cores'),
+                mem.get('total'), mem.get('available'), mem.get('used'), mem.get('percent'),
+                net.get('bytes_sent'), net.get('bytes_recv')
+            ))
+            if cpu.get('percpu'):
+                cpus.append((t, quantize_percent(cpu['percpu'])))
+            for mountpoint, info in (s.get('disk') or {}).items():
+                disks.append((t, self._mount_id(mountpoint, info),
+                              info.get('total'), info.get('used'), info.get('free')))
+            for kind, devices in (s.get('devices') or {}).items():
+                for name, rates in devices.items():
+                    devs.append((self._device_id(kind, name), t) + tuple(rates.get(m) for m in DEVICE_KINDS[kind]))
+
+        marks = ', '.join('?' for _ in SAMPLE_COLUMNS)
+        for day, (samples, cpus, disks, devs) in by_day.items():
+            p = self._partition(day)
+            self._db_conn.executemany(
+                f"INSERT OR IGNORE INTO samples{p} ({', '.join(SAMPLE_COLUMNS)}) VALUES ({marks})", samples
+            )
+            self._db_conn.executemany(
+                f"INSERT OR IGNORE INTO sample_percpu{p} (t, percpu) VALUES (?, ?)", cpus
+            )
+            self._db_conn.executemany(
+                f"INSERT OR IGNORE INTO sample_disk{p} (t, mount_id, total, used, free) VALUES (?, ?, ?, ?, ?)",
+                disks
+            )
+            if devs:
+                self._db_conn.executemany(
+                    f"INSERT OR IGNORE INTO sample_dev{p} (dev_id, t, {', '.join(DEVICE_COLUMNS)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    devs
+                )
+
+    def save_rollups(self, closed):
+        """Insert closed rollup buckets, given as (tier, row) pairs."""
+        cols = ', '.join(ROLLUP_COLUMNS)
+        marks = ', '.join('?' for _ in ROLLUP_COLUMNS)
+        with self._db_lock:
+            with self._db_conn:
+                self._db_conn.executemany(
+                    f"INSERT OR REPLACE INTO rollups (tier, t, {cols}) VALUES (?, ?, {marks})",
+                    [(tier, row['t']) + tuple(row[c] for c in ROLLUP_COLUMNS) for tier, row in closed]
+                )
+
+    def save_burst(self, rows):
+        """Insert high-resolution burst rows (dicts with BURST_COLUMNS)."""
+        with self._db_lock:
+            with self._db_conn:
+                self._db_conn.executemany(
+                    f"INSERT OR IGNORE INTO burst ({', '.join(BURST_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                    [tuple(row[c] for c in BURST_COLUMNS) for row in rows]
+                )
+
+    # Reads
+    def load_snapshots(self, start_ts, end_ts=float('inf')):
+        """Return snapshot dicts with start_ts <= t <= end_ts, oldest first.
+
+        Buffered samples are flushed first so readers see everything sampled so far.
+        """
+        self.flush()
+        rows, packed_rows, disk_rows = [], [], []
+        with self._db_lock:
+            cur = self._db_conn.cursor()
+            for p in self._partitions(start_ts, end_ts):
+                cur.execute(
+                    f"SELECT {', '.join(SAMPLE_COLUMNS)} FROM samples{p} WHERE t >= ? AND t <= ? ORDER BY t ASC",
+                    (start_ts, end_ts)
+                )
+                rows.extend(cur.fetchall())
+                cur.execute(
+                    f"SELECT t, percpu FROM sample_percpu{p} WHERE t >= ? AND t <= ?", (start_ts, end_ts)
+                )
+                packed_rows.extend(cur.fetchall())
+                cur.execute(
+                    f"""
+                    SELECT d.t, m.mountpoint, m.device, m.fstype, d.total, d.used, d.free
+                    FROM sample_disk{p} d JOIN mounts m ON m.id = d.mount_id
+                    WHERE d.t >= ? AND d.t <= ?
+                    """,
+                    (start_ts, end_ts)
+                )
+                disk_rows.extend(cur.fetchall())
+
+        percpu = {t: [float(v) for v in packed] for t, packed in packed_rows}
+        disks = {}
+        for t, mountpoint, device, fstype, total, used, free in disk_rows:
+            disks.setdefault(t, {})[mountpoint] = {
+                'device': device,
+                'total': total,
+                'used': used,
+                'free': free,
+                'percent': round(used / (used + free) * 100, 1) if used + free else 0.0,
+                'fstype': fstype
+            }
+        return [self._row_to_snapshot(row, percpu.get(row[0], []), disks.get(row[0], {})) for row in rows]
+
+    def load_snapshots_before(self, before_ts, start_ts, limit):
+        """Return up to `limit` of the newest snapshots with start_ts <= t < before_ts, oldest first.
+
+        Walking backwards with the first returned t as the next before_ts
+        reads the history newest-to-oldest in chunks.
+        """
+        row = None
+        remaining = limit
+        with self._db_lock:
+            for p in reversed(self._partitions(start_ts, before_ts)):
+                ts = self._db_conn.execute(
+                    f"SELECT t FROM samples{p} WHERE t < ? AND t >= ? ORDER BY t DESC LIMIT ?",
+                    (before_ts, start_ts, remaining)
+                ).fetchall()
+                remaining -= len(ts)
+                if remaining <= 0:
+                    row = ts[-1]
+                    break
+        lo = row[0] if row else start_ts
+        return self.load_snapshots(lo, math.nextafter(before_ts, -math.inf))
+
+    @staticmethod
+    def _row_to_snapshot(row, percpu, disk):
+        r = dict(zip(SAMPLE_COLUMNS, row))
+        return {
+            # t was produced from a naive utcnow(), so fromtimestamp() gives the UTC wall clock back
+            'ts': datetime.fromtimestamp(r['t']).isoformat() + 'Z',
+            't': r['t'],
+            'cpu': {
+                'avg': r['cpu_avg'],
+                'percpu': percpu,
+                'frequency': {'current': r['cpu_freq'], 'min': r['freq_min'], 'max': r['freq_max']},
+                'cores': r['cores'],
+                'logical_cores': r['logical_cores']
+            },
+            'memory': {
+                'total': r['mem_total'],
+                'available': r['mem_available'],
+                'used': r['mem_used'],
+                'percent': r['mem_percent']
+            },
+            'disk': disk,
+            'net': {'bytes_sent': r['bytes_sent'], 'bytes_recv': r['bytes_recv']}
+        }
+
+    def load_device_rates(self, kind, name, start_ts, end_ts=float('inf')):
+        """Return {'t': [...], <metric>: [...]} of one device's rates with start_ts <= t <= end_ts."""
+        self.flush()
+        metrics = DEVICE_KINDS[kind]
+        out = {'t': []}
+        out.update({m: [] for m in metrics})
+        with self._db_lock:
+            try:
+                row = self._db_conn.execute(
+                    "SELECT id FROM devices WHERE kind = ? AND name = ?", (kind, name)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # read-only DB written by a version without device rates
+                return out
+            if row is None:
+                return out
+            for p in self._partitions(start_ts, end_ts):
+                try:
+                    rows = self._db_conn.execute(
+                        f"SELECT t, {', '.join(DEVICE_COLUMNS)} FROM sample_dev{p} "
+                        "WHERE dev_id = ? AND t >= ? AND t <= ? ORDER BY t ASC",
+                        (row[0], start_ts, end_ts)
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    continue
+                for r in rows:
+                    out['t'].append(r[0])
+                    for m, v in zip(metrics, r[1:]):
+                        out[m].append(v)
+        return out
+
+    def device_names(self):
+        """{kind: [device, ...]} of every device with stored rates."""
+        out = {kind: [] for kind in DEVICE_KINDS}
+        with self._db_lock:
+            try:
+                rows = self._db_conn.execute("SELECT kind, name FROM devices ORDER BY name").fetchall()
+            except sqlite3.OperationalError:
+                return out
+        for kind, name in rows:
+            if kind in out:
+                out[kind].append(name)
+        return out
+
+    def iter_samples(self, start_ts, end_ts=float('inf'), with_disk=False, chunk=1000):
+        """Yield lists of up to `chunk` sample rows with start_ts <= t <= end_ts, oldest first.
+
+        Rows are SAMPLE_COLUMNS, followed with with_disk by the used and total
+        bytes summed over the sample's mounts. Rows are paged with fetchmany on a
+        separate read-only connection, so memory stays flat for any range and the
+        DB lock is only held to flush and list the partitions, not while the
+        caller consumes the rows.
+        """
+        self.flush()
+        with self._db_lock:
+            partitions = self._partitions(start_ts, end_ts)
+        disk = ''
+        if with_disk:
+            disk = (", (SELECT SUM(used) FROM sample_disk{p} d WHERE d.t = s.t)"
+                    ", (SELECT SUM(used + free) FROM sample_disk{p} d WHERE d.t = s.t)")
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False, timeout=30)
+        try:
+            for p in partitions:
+                cur = conn.cursor()
+                try:
+                    cur.execute(
+                        f"SELECT {', '.join('s.' + c for c in SAMPLE_COLUMNS)}{disk.format(p=p)} "
+                        f"FROM samples{p} s WHERE s.t >= ? AND s.t <= ? ORDER BY s.t ASC",
+                        (start_ts, end_ts)
+                    )
+                except sqlite3.OperationalError:
+                    # dropped by retention since we listed it
+                    continue
+                while True:
+                    rows = cur.fetchmany(chunk)
+                    if not rows:
+                        break
+                    yield rows
+                cur.close()
+        finally:
+            conn.close()
+
+    def load_rollups(self, tier, start_ts):
+        """Return persisted rollup rows (dicts) for a tier with t >= start_ts, oldest first."""
+        cols = ('t',) + ROLLUP_COLUMNS
+        with self._db_lock:
+            cur = self._db_conn.cursor()
+            cur.execute(
+                f"SELECT {', '.join(cols)} FROM rollups WHERE tier = ? AND t >= ? ORDER BY t ASC",
+                (tier, start_ts)
+            )
+            rows = cur.fetchall()
+        return [dict(zip(cols, row)) for row in rows]
+
+    def load_burst(self, start_ts, end_ts=float('inf')):
+        """Return burst rows (dicts) with start_ts <= t <= end_ts, oldest first."""
+        with self._db_lock:
+            rows = self._db_conn.execute(
+                f"SELECT {', '.join(BURST_COLUMNS)} FROM burst WHERE t >= ? AND t <= ? ORDER BY t ASC",
+                (start_ts, end_ts)
+            ).fetchall()
+        return [dict(zip(BURST_COLUMNS, row)) for row in rows]
+
+    # Maintenance
+    def cleanup(self, cutoff_ts, vacuum_pages=1000, burst_cutoff_ts=None):
+        """Drop the day partitions that end before cutoff_ts and trim old rollups.
+
+        Samples in the partition straddling the cutoff are kept until the
+        whole day expires. Burst rows older than burst_cutoff_ts (the
+        cutoff by default) are deleted. Freed pages are returned to the OS with
+        incremental vacuum steps of vacuum_pages, releasing the lock between
+        steps so the sampler's flushes are not held up.
+        Returns {'dropped': ['YYYYMMDD', ...], 'reclaimed_bytes': n, 'file_bytes': n}.
+        """
+        with self._db_lock:
+            expired = [d for d in sorted(self._days) if (d + 1) * DAY <= cutoff_ts]
+            size_before = self._file_bytes()
+            with self._db_conn:
+                for day in expired:
+                    for table in PARTITIONED:
+                        self._db_conn.execute(f"DROP TABLE IF EXISTS {table}{_suffix(day)}")
+                    self._days.discard(day)
+                self._db_conn.execute("DELETE FROM rollups WHERE t < ?", (cutoff_ts,))
+                self._db_conn.execute(
+                    "DELETE FROM burst WHERE t < ?", (cutoff_ts if burst_cutoff_ts is None else burst_cutoff_ts,)
+                )
+        while True:
+            with self._db_lock:
+                free = self._db_conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                self._db_conn.execute(f"PRAGMA incremental_vacuum({vacuum_pages})")
+                if self._db_conn.execute("PRAGMA freelist_count").fetchone()[0] >= free:
+                    # auto_vacuum is off (file created before it): freed pages are reused instead
+                    break
+        with self._db_lock:
+            # move the WAL contents back into the (now smaller) main file
+            self._db_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_after = self._file_bytes()
+        return {
+            'dropped': [_suffix(d)[1:] for d in expired],
+            'reclaimed_bytes': max(0, size_before - size_after),
+            'file_bytes': size_after
+        }
+
+    def _file_bytes(self):
+        """Size of the DB pages (excluding the WAL). Caller holds the lock."""
+        page_count = self._db_conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._db_conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def _migrate_snapshots(self, chunk=1000):
+        """Copy rows from the legacy JSON `snapshots` table into the typed schema, then drop it.
+
+        Each chunk is its own transaction and inserts ignore samples already
+        present, so an interrupted migration simply resumes on the next start.
+        """
+        with self._db_lock:
+            exists = self._db_conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'snapshots'"
+            ).fetchone()
+            if not exists:
+                return
+            last_id = 0
+            migrated = 0
+            while True:
+                rows = self._db_conn.execute(
+                    "SELECT id, snapshot FROM snapshots WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)
+                ).fetchall()
+                if not rows:
+                    break
+                snaps = []
+                for row_id, snap_json in rows:
+                    last_id = row_id
+                    try:
+                        snaps.append(json.loads(snap_json))
+                    except Exception:
+                        continue
+                with self._db_conn:
+                    self._insert(snaps)
+                migrated += len(snaps)
+            with self._db_conn:
+                self._db_conn.execute("DROP TABLE snapshots")
+            print(f'Migrated {migrated} snapshots to the typed schema')
+
+    def close(self):
+        """Flush pending samples and close the connection."""
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self._db_conn.close()
@@ -0,0 +1,22 @@
+from rollups import lttb_indices
+
+
+def test_lttb_keeps_every_point_under_threshold():
+    assert lttb_indices(list(range(5)), [1, 2, 3, 4, 5], 10) == [0, 1, 2, 3, 4]
+
+
+def test_lttb_small_thresholds():
+    x = list(range(23))
+    y = [i % 5 for i in x]
+    assert lttb_indices(x, y, 2) == [0, 22]
+    assert lttb_indices(x, y, 1) == [22]
+
+
+def test_lttb_keeps_ends_and_spike():
+    x = list(range(100))
+    y = [0.0] * 100
+    y[50] = 100.0
+    keep = lttb_indices(x, y, 10)
+    assert len(keep) == 10
+    assert keep[0] == 0 and keep[-1] == 99
+    assert 50 in keep